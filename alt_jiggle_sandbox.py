@@ -1,10 +1,12 @@
 import os
 import random
 import sys
+import time
 from typing import Dict
 from data_keys import (
     MapNames as MN,
     LocationKeys as LK,
+    ScoringKeys as SK,
 )
 from dotenv import load_dotenv
 from api import getGeneralData, getMapData
@@ -16,10 +18,11 @@ from best import best
 from store import store
 from submit import get_solution, load_game
 from suggestion import get_total
+from undo_log import UndoLog
 
 
 load_dotenv()
-apiKey = os.environ["apiKey"]
+apiKey = os.environ.get("apiKey", "")
 
 
 def jiggle_sandbox(
@@ -30,13 +33,14 @@ def jiggle_sandbox(
     distance_cache: Dict[str, Dict],
     sandbox_names: Dict[str, str],
     hotspot_footfall_cache: Dict,
+    log: UndoLog,
 ) -> Dict:
     key = random.choice(list(solution[LK.locations].keys()))
     location = solution[LK.locations][key]
     if random.random() > 0.4:
-        increase(location)
+        increase(location, log)
     else:
-        decrease(location)
+        decrease(location, log)
 
     return calculateScore(
         mapName,
@@ -52,20 +56,20 @@ def jiggle_sandbox(
     )
 
 
-def increase(location):
+def increase(location, log: UndoLog):
     if location[LK.f3100Count] < Settings.max_stations:
-        location[LK.f3100Count] += 1
+        log.set(location, LK.f3100Count, location[LK.f3100Count] + 1)
     elif location[LK.f9100Count] < Settings.max_stations:
-        location[LK.f3100Count] = 0
-        location[LK.f9100Count] += 1
+        log.set(location, LK.f3100Count, 0)
+        log.set(location, LK.f9100Count, location[LK.f9100Count] + 1)
 
 
-def decrease(location):
+def decrease(location, log: UndoLog):
     if location[LK.f3100Count] > 0:
-        location[LK.f3100Count] -= 1
+        log.set(location, LK.f3100Count, location[LK.f3100Count] - 1)
     elif location[LK.f9100Count] > 0:
-        location[LK.f9100Count] -= 1
-        location[LK.f3100Count] = 2
+        log.set(location, LK.f9100Count, location[LK.f9100Count] - 1)
+        log.set(location, LK.f3100Count, 2)
 
 
 def jiggle(mapName: str) -> None:
@@ -85,6 +89,9 @@ def jiggle(mapName: str) -> None:
         distance_cache = build_distance_cache(solution[LK.locations], generalData)
     else:
         raise SystemError("WRONG PROGRAM FOR NOT SANDBOX")
+    # mutations since the best solution, rolled back instead of reloading the game
+    log = UndoLog()
+    last_sync = time.perf_counter()
 
     while True:
         score = jiggle_sandbox(
@@ -95,6 +102,7 @@ def jiggle(mapName: str) -> None:
             distance_cache,
             sandbox_names,
             hotspot_footfall_cache,
+            log,
         )
 
         new_total = get_total(score)
@@ -102,20 +110,25 @@ def jiggle(mapName: str) -> None:
             print("")
             store(mapName, score)
             total = new_total
+            id = score[SK.gameId]
+            log.commit()
         elif abs(new_total - total) < 16.0:
             # print("+", end="", flush=True)
             pass
         else:
             # print("_", end="", flush=True)
-            total, new_id = best(mapName)
-            game = load_game(id)
-            solution = get_solution(game)
-            if new_id != id:
-                print(total)
-                id = new_id
-                distance_cache = build_distance_cache(
-                    solution[LK.locations], generalData
-                )
+            log.rollback()
+            if time.perf_counter() - last_sync > Settings.jiggle_sync_interval:
+                # pick up improvements from other processes now and then
+                last_sync = time.perf_counter()
+                best_total, best_id = best(mapName)
+                if best_total > total:
+                    print(best_total)
+                    total, id = best_total, best_id
+                    solution = get_solution(load_game(id))
+                    distance_cache = build_distance_cache(
+                        solution[LK.locations], generalData
+                    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,291 @@
+import math
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Union
+from data_keys import (
+    MapNames as MN,
+    MapKeys as MK,
+    LocationKeys as LK,
+)
+from dotenv import load_dotenv
+from api import getGeneralData, getMapData
+from map_bundle import distance_cache as map_distance_cache
+from incremental_scoring import RegularState, SandboxState
+from map_limiter import MapLimiter
+from scoring import calculateScore
+
+from settings import Settings
+from best import best
+from store import store
+from submit import get_solution, load_game
+
+
+load_dotenv()
+apiKey = os.environ.get("apiKey", "")
+
+State = Union[RegularState, SandboxState]
+Undo = Callable[[], None]
+Operator = Callable[[State], Optional[Undo]]
+
+CONFIGURATIONS = [
+    (f3, f9)
+    for f3 in range(Settings.max_stations + 1)
+    for f9 in range(Settings.max_stations + 1)
+]
+
+
+class Schedule:
+    def __init__(self, t_start: float, t_end: float, steps: int) -> None:
+        self.t_start = t_start
+        self.t_end = t_end
+        self.steps = steps
+
+    def temperature(self, progress: float) -> float:
+        # geometric cooling from t_start to t_end, progress goes from 0 to 1
+        progress = min(1.0, progress)
+        return self.t_start * math.pow(self.t_end / self.t_start, progress)
+
+
+def regular_operators(state: RegularState) -> List[Operator]:
+    keys = list(state.base_sales)
+
+    def random_counts(state: RegularState) -> Optional[Undo]:
+        key = random.choice(keys)
+        current = state.get_counts(key)
+        f3, f9 = random.choice(CONFIGURATIONS)
+        if (f3, f9) == current:
+            return None
+        if f3 == f9 == 0 and len(state.counts) == 1 and key in state.counts:
+            return None  # scoring needs at least one location
+        state.set_counts(key, f3, f9)
+        return lambda: state.set_counts(key, *current)
+
+    def step_counts(state: RegularState) -> Optional[Undo]:
+        key = random.choice(keys)
+        current = state.get_counts(key)
+        f3, f9 = current
+        if random.random() > 0.5:
+            if f3 < Settings.max_stations:
+                f3 += 1
+            elif f9 < Settings.max_stations:
+                f3, f9 = 0, f9 + 1
+            else:
+                return None
+        else:
+            if f3 > 0:
+                f3 -= 1
+            elif f9 > 0:
+                f3, f9 = Settings.max_stations, f9 - 1
+            else:
+                return None
+            if f3 == f9 == 0 and len(state.counts) == 1:
+                return None
+        state.set_counts(key, f3, f9)
+        return lambda: state.set_counts(key, *current)
+
+    return [random_counts, step_counts]
+
+
+def sandbox_operators(state: SandboxState, map_limiter: MapLimiter) -> List[Operator]:
+    keys = list(state.locations)
+    step_lat = map_limiter.latitudeDiff * Settings.anneal_step_factor
+    step_long = map_limiter.longitudeDiff * Settings.anneal_step_factor
+
+    def random_counts(state: SandboxState) -> Optional[Undo]:
+        key = random.choice(keys)
+        current = state.get_counts(key)
+        f3, f9 = random.choice(CONFIGURATIONS[1:])  # always keep a station
+        if (f3, f9) == current:
+            return None
+        state.set_counts(key, f3, f9)
+        return lambda: state.set_counts(key, *current)
+
+    def nudge_position(state: SandboxState) -> Optional[Undo]:
+        key = random.choice(keys)
+        latitude, longitude = state.get_position(key)
+        state.set_position(
+            key,
+            map_limiter.latitude(latitude + step_lat * 2 * (random.random() - 0.5)),
+            map_limiter.longitude(longitude + step_long * 2 * (random.random() - 0.5)),
+        )
+        return lambda: state.set_position(key, latitude, longitude)
+
+    return [random_counts, nudge_position]
+
+
+class Annealer:
+    def __init__(
+        self,
+        state: State,
+        operators: List[Operator],
+        schedule: Schedule,
+        on_improvement: Callable[[State], None],
+    ) -> None:
+        self.state = state
+        self.operators = operators
+        self.schedule = schedule
+        self.on_improvement = on_improvement
+        self.current = state.total
+        self.best = state.total
+        self.steps = 0
+        self.accepted = 0
+
+    def run(
+        self,
+        seconds: Optional[float] = None,
+        annealed: float = 0.0,
+        horizon: Optional[float] = None,
+    ) -> float:
+        # without seconds the schedule cools over its steps. with seconds it
+        # cools over the time instead, annealed seconds spent on earlier runs
+        # of the map and a horizon let several runs share one schedule, the
+        # temperature starts over every horizon
+        state = self.state
+        operators = self.operators
+        schedule = self.schedule
+        horizon = horizon or seconds
+        # temperatures are relative to the size of the score
+        scale = abs(self.current) if self.current != 0 else 1.0
+        start = time.perf_counter()
+        last_report = start
+        report_steps = 0
+
+        def timed_temperature(now: float) -> float:
+            progress = (annealed + now - start) % horizon / horizon
+            return schedule.temperature(progress) * scale
+
+        temperature = (
+            timed_temperature(start)
+            if horizon is not None
+            else schedule.temperature(0.0) * scale
+        )
+        step = 0
+        while seconds is not None or step < schedule.steps:
+            if seconds is None:
+                temperature = schedule.temperature(step / schedule.steps) * scale
+            step += 1
+            undo = random.choice(operators)(state)
+            if undo is not None:
+                self.steps += 1
+                delta = state.total - self.current
+                if delta >= 0 or random.random() < math.exp(delta / temperature):
+                    self.current = state.total
+                    self.accepted += 1
+                    if self.current > self.best:
+                        self.best = self.current
+                        self.on_improvement(state)
+                else:
+                    undo()
+
+            if step % 1000 == 0:
+                now = time.perf_counter()
+                if now - last_report > Settings.anneal_report_interval:
+                    rate = (self.steps - report_steps) / (now - last_report)
+                    print(
+                        f"{self.steps} steps\t{rate:.0f} steps/s\t"
+                        f"T {temperature:.4g}\tcurrent {self.current:.2f}\t"
+                        f"best {self.best:.2f}"
+                    )
+                    last_report = now
+                    report_steps = self.steps
+                    # keep the running sums from drifting
+                    state.resync()
+                    self.current = state.total
+                if seconds is not None:
+                    if now - start > seconds:
+                        break
+                    temperature = timed_temperature(now)
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            print(
+                f"{self.steps} steps in {elapsed:.1f}s\t{self.steps / elapsed:.0f} steps/s"
+            )
+        return self.best
+
+
+def anneal(
+    mapName: str,
+    seconds: Optional[float] = None,
+    annealed: float = 0.0,
+    horizon: Optional[float] = None,
+) -> None:
+    mapEntity = getMapData(mapName, apiKey, Settings.cache_folder)
+    generalData = getGeneralData(Settings.cache_folder)
+    if not mapEntity or not generalData:
+        raise SystemError("Unable to load map and general data")
+
+    total, id = best(mapName)
+    print(f"{total}\t\t{id}")
+    solution = get_solution(load_game(id))
+
+    state: State
+    if mapName in [MN.gSandbox, MN.sSandbox]:
+        map_limiter = MapLimiter(
+            latitudeMin=mapEntity[MK.border][MK.latitudeMin],
+            latitudeMax=mapEntity[MK.border][MK.latitudeMax],
+            longitudeMin=mapEntity[MK.border][MK.longitudeMin],
+            longitudeMax=mapEntity[MK.border][MK.longitudeMax],
+        )
+        state = SandboxState(mapEntity, generalData, solution)
+        operators = sandbox_operators(state, map_limiter)
+    else:
+        distance_cache = map_distance_cache(mapName, mapEntity, generalData)
+        state = RegularState(mapEntity, generalData, distance_cache, solution)
+        operators = regular_operators(state)
+
+    def persist(solution: Dict, distance_cache: Dict[str, Dict]) -> None:
+        # score with the regular scorer so the stored game is complete
+        if mapName in [MN.gSandbox, MN.sSandbox]:
+            names = {key: key for key in solution[LK.locations]}
+            score = calculateScore(
+                mapName,
+                solution,
+                {},
+                mapEntity,
+                generalData,
+                distance_cache,
+                sandbox_names=names,
+                inverse_sandbox_names=names,
+                hotspot_footfall_cache={},
+            )
+        else:
+            score = calculateScore(
+                mapName, solution, {}, mapEntity, generalData, distance_cache
+            )
+        store(mapName, score)
+
+    def snapshot(state: State) -> Dict:
+        if isinstance(state, SandboxState):
+            return {"solution": state.solution(), "cache": state.distance_cache()}
+        return {"solution": state.solution(), "cache": distance_cache}
+
+    last_stored = time.perf_counter()
+    unstored: Optional[Dict] = None
+
+    def on_improvement(state: State) -> None:
+        nonlocal last_stored, unstored
+        unstored = snapshot(state)
+        now = time.perf_counter()
+        if now - last_stored > Settings.anneal_store_interval:
+            persist(unstored["solution"], unstored["cache"])
+            last_stored = now
+            unstored = None
+
+    schedule = Schedule(
+        Settings.anneal_t_start, Settings.anneal_t_end, Settings.anneal_steps
+    )
+    annealer = Annealer(state, operators, schedule, on_improvement)
+    annealer.run(seconds, annealed, horizon)
+    if unstored is not None:
+        persist(unstored["solution"], unstored["cache"])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2:
+        anneal(sys.argv[1])
+    elif len(sys.argv) == 3:
+        anneal(sys.argv[1], float(sys.argv[2]))
+    else:
+        print("Wrong number of arguments")
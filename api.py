@@ -1,11 +1,98 @@
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 import os
 import json
+import time
 from dotenv import load_dotenv
 
+from settings import Settings
+
 load_dotenv()
-domain = os.environ["domain"]
+
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+# a post is only retried when the server cannot have acted on it
+POST_RETRY_STATUSES = [429]
+
+
+class ApiError(Exception):
+    pass
+
+
+session: Optional[requests.Session] = None
+
+
+def get_domain() -> str:
+    # read when needed so that importing works without a .env
+    domain = os.environ.get("domain")
+    if not domain:
+        raise ApiError("Missing domain, did you forget to add it to the .env file?")
+    return domain.rstrip("/")
+
+
+def get_api_key() -> str:
+    apiKey = os.environ.get("apiKey")
+    if not apiKey:
+        raise ApiError("Missing apiKey, did you forget to add it to the .env file?")
+    return apiKey
+
+
+def get_session() -> requests.Session:
+    global session
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=Settings.api_pool_size,
+            pool_maxsize=Settings.api_pool_size,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    return session
+
+
+def never_sent(e: requests.RequestException) -> bool:
+    # connecting failed, a timeout or error after that may have been accepted
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def request(method: str, endpoint: str, **kwargs: Any) -> Any:
+    # gets are retried on any failure, a submission twice is two submissions
+    idempotent = method == "GET"
+    statuses = RETRY_STATUSES if idempotent else POST_RETRY_STATUSES
+    url = f"{get_domain()}/api/Game/{endpoint}"
+    delay = Settings.api_backoff
+    error = ""
+    for attempt in range(Settings.api_retries + 1):
+        if attempt > 0:
+            time.sleep(delay)
+            delay *= 2
+        try:
+            resp = get_session().request(
+                method, url, timeout=Settings.api_timeout, **kwargs
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if not idempotent and not never_sent(e):
+                raise ApiError(f"{endpoint} failed: {e}") from e
+            error = str(e)
+            continue
+        if resp.status_code in statuses:
+            error = f"{resp.status_code} {resp.text[:200]}"
+            continue
+        if not resp.ok:
+            # the request is wrong or a post the server may have acted on
+            raise ApiError(f"{endpoint} failed with {resp.status_code}: {resp.text}")
+        try:
+            return resp.json()
+        except ValueError as e:
+            raise ApiError(
+                f"{endpoint} returned invalid json: {resp.text[:200]}"
+            ) from e
+    attempts = Settings.api_retries + 1
+    raise ApiError(f"{endpoint} failed after {attempts} attempts: {error}")
 
 
 def getMapData(mapName, apiKey: str, cache_folder: str) -> Optional[Dict]:
@@ -13,17 +100,17 @@ def getMapData(mapName, apiKey: str, cache_folder: str) -> Optional[Dict]:
     if not os.path.exists(path):
         print(f"getting map data for {mapName}")
         try:
-            resp = requests.get(
-                f"{domain}/api/Game/getMapData?mapName={mapName}",
-                headers={"x-api-key": apiKey},
+            data = request(
+                "GET",
+                "getMapData",
+                params={"mapName": mapName},
+                headers={"x-api-key": apiKey or get_api_key()},
             )
-            resp.raise_for_status()
-        except:
-            print(resp)
+        except ApiError as e:
+            print(e)
             return None
-        else:
-            with open(path, "w", encoding="utf8") as f:
-                json.dump(resp.json(), f, indent=4)
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(data, f, indent=4)
     with open(path, "r", encoding="utf8") as f:
         return json.load(f)
 
@@ -33,39 +120,33 @@ def getGeneralData(cache_folder: str) -> Optional[Dict]:
     if not os.path.exists(path):
         print("getting general data")
         try:
-            resp = requests.get(f"{domain}/api/Game/getGeneralGameData")
-            resp.raise_for_status()
-        except:
-            print(resp)
+            data = request("GET", "getGeneralGameData")
+        except ApiError as e:
+            print(e)
             return None
-        else:
-            with open(path, "w", encoding="utf8") as f:
-                json.dump(resp.json(), f, indent=4)
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(data, f, indent=4)
     with open(path, "r", encoding="utf8") as f:
         return json.load(f)
 
 
 def getGame(id_: str) -> Optional[Dict]:
     try:
-        resp = requests.get(f"{domain}/api/Game/getGameData?gameId={id_}")
-        resp.raise_for_status()
-    except:
-        print(resp)
+        return request("GET", "getGameData", params={"gameId": id_})
+    except ApiError as e:
+        print(e)
         return None
-    else:
-        return resp.json()
 
 
 def submit(mapName: str, solution: Dict, apiKey: str) -> Optional[Dict]:
     try:
-        resp = requests.post(
-            f"{domain}/api/Game/submitSolution?mapName={mapName}",
-            headers={"x-api-key": apiKey},
+        return request(
+            "POST",
+            "submitSolution",
+            params={"mapName": mapName},
+            headers={"x-api-key": apiKey or get_api_key()},
             json=solution,
         )
-        resp.raise_for_status()
-    except:
-        print(resp)
+    except ApiError as e:
+        print(e)
         return None
-    else:
-        return resp.json()
@@ -0,0 +1,183 @@
+import gzip
+import json
+import lzma
+import os
+import sys
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from data_keys import (
+    LocationKeys as LK,
+    ScoringKeys as SK,
+)
+from helper import get_solution
+from settings import Settings
+
+try:
+    import fcntl
+except ImportError:  # not on windows
+    fcntl = None  # type: ignore
+
+
+def archive_path(mapName: str) -> str:
+    suffix = {None: "", "gzip": ".gz", "lzma": ".xz"}[Settings.archive_compression]
+    return f"{Settings.game_folder}/{mapName}.archive{suffix}"
+
+
+def open_archive(path: str, mode: str) -> IO[str]:
+    # appending to gzip and lzma files adds a new member/stream, readers handle both
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf8")
+    if path.endswith(".xz"):
+        return lzma.open(path, mode + "t", encoding="utf8")
+    return open(path, mode, encoding="utf8")
+
+
+def find_archives() -> List[str]:
+    if not os.path.exists(Settings.game_folder):
+        return []
+    return [
+        f"{Settings.game_folder}/{name}"
+        for name in sorted(os.listdir(Settings.game_folder))
+        if ".archive" in name
+    ]
+
+
+class ArchiveWriter:
+    def __init__(self) -> None:
+        # mapName -> (id, solution) of the last game written by this writer
+        self.previous: Dict[str, Tuple[str, Dict[str, Dict]]] = {}
+        self.since_snapshot: Dict[str, int] = {}
+
+    def record(self, mapName: str, score: Dict) -> Dict:
+        locations = get_solution(score)[LK.locations]
+        record: Dict = {SK.gameId: score[SK.gameId], SK.gameScore: score[SK.gameScore]}
+        parent = self.previous.get(mapName)
+        count = self.since_snapshot.get(mapName, 0)
+        if parent is None or count >= Settings.archive_snapshot_interval:
+            # the first record of every writer is a snapshot, no need to read back
+            record["full"] = locations
+            self.since_snapshot[mapName] = 0
+        else:
+            # the parent is named since several processes may append to one archive
+            parent_id, previous = parent
+            record["parent"] = parent_id
+            record["set"] = {
+                key: location
+                for key, location in locations.items()
+                if previous.get(key) != location
+            }
+            record["del"] = [key for key in previous if key not in locations]
+            self.since_snapshot[mapName] = count + 1
+        self.previous[mapName] = (score[SK.gameId], locations)
+        return record
+
+    def append(self, mapName: str, scores: List[Dict]) -> None:
+        records = [self.record(mapName, score) for score in scores]
+        path = archive_path(mapName)
+        try:
+            # a compressed member is written in several calls, the lock keeps
+            # appends from other processes from interleaving with it
+            with open(path, "ab") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                with open_archive(path, "a") as f:
+                    f.write(
+                        "".join(
+                            json.dumps(record, separators=(",", ":")) + "\n"
+                            for record in records
+                        )
+                    )
+        except BaseException:
+            # the parent may not be on disk, the next record is a snapshot
+            self.previous.pop(mapName, None)
+            self.since_snapshot.pop(mapName, None)
+            raise
+
+
+writer = ArchiveWriter()
+
+
+def append(mapName: str, scores: List[Dict]) -> None:
+    writer.append(mapName, scores)
+
+
+def iter_games(path: str) -> Iterator[Dict]:
+    # streams the archive and rebuilds each game from the deltas
+    mapName = os.path.basename(path).split(".archive")[0]
+    # the latest solution of every chain, one chain per writer that appended
+    chains: Dict[str, Dict[str, Dict]] = {}
+    with open_archive(path, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            if "full" in record:
+                locations = record["full"]
+            else:
+                parent = chains.pop(record["parent"], None)
+                if parent is None:
+                    # the parent was never written, the game can't be rebuilt
+                    print(
+                        f"{path}: game {record[SK.gameId]} has no parent "
+                        f"{record['parent']}, skipped",
+                        file=sys.stderr,
+                    )
+                    continue
+                locations = dict(parent)
+                locations.update(record["set"])
+                for key in record["del"]:
+                    del locations[key]
+            chains[record[SK.gameId]] = locations
+            yield {
+                SK.gameId: record[SK.gameId],
+                SK.mapName: mapName,
+                LK.locations: locations,
+                SK.gameScore: record[SK.gameScore],
+            }
+
+
+def load_game(id: str, mapName: Optional[str] = None) -> Optional[Dict]:
+    paths = find_archives()
+    if mapName is not None:
+        paths = [
+            path
+            for path in paths
+            if os.path.basename(path).startswith(mapName + ".archive")
+        ]
+    for path in paths:
+        for game in iter_games(path):
+            if game[SK.gameId] == id:
+                return game
+    return None
+
+
+def pack(mapName: str) -> None:
+    # one-shot conversion of the logged game files of a map into its archive
+    log_path = f"{Settings.log_folder}/{mapName}.txt"
+    packer = ArchiveWriter()
+    before = 0
+    count = 0
+    with open(log_path, "r", encoding="utf8") as log:
+        with open_archive(archive_path(mapName), "w") as f:
+            for line in log:
+                parts = line.rstrip().split(" ")
+                if len(parts) < 2:
+                    continue
+                path = f"{Settings.game_folder}/{parts[1]}.json"
+                if not os.path.exists(path):
+                    continue
+                before += os.path.getsize(path)
+                with open(path, "r", encoding="utf8") as game:
+                    record = packer.record(mapName, json.load(game))
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                count += 1
+    after = os.path.getsize(archive_path(mapName))
+    print(f"{mapName}: {count} games, {before} bytes -> {after} bytes")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "pack":
+        pack(sys.argv[2])
+    elif len(sys.argv) == 3 and sys.argv[1] == "show":
+        game = load_game(sys.argv[2])
+        print(json.dumps(game, indent=4) if game else "Not found")
+    else:
+        print("Wrong number of arguments")
@@ -0,0 +1,147 @@
+import atexit
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Optional, Set
+
+import api
+from data_keys import ScoringKeys as SK
+from helper import get_solution
+from settings import Settings
+from submit import apiKey, best_submitted, record_submission
+
+
+def solution_hash(score: Dict) -> str:
+    solution = get_solution(score)
+    data = json.dumps(solution, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(data.encode("utf8")).hexdigest()
+
+
+class AutoSubmitter:
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        # mapName -> the latest improvement that has not been submitted
+        self.pending: Dict[str, Dict] = {}
+        self.last_time: Dict[str, float] = {}
+        # the best submitted total, read from the submissions on first use
+        self.last_total: Dict[str, Optional[float]] = {}
+        self.hashes: Dict[str, Set[str]] = {}
+        # maps the thread has taken and not finished submitting
+        self.submitting = 0
+        self.thread: Optional[threading.Thread] = None
+
+    def offer(self, mapName: str, score: Dict) -> None:
+        # called by store, only hands over the score
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.pending[mapName] = score
+            self.condition.notify()
+
+    def due(self, mapName: str, now: float) -> float:
+        # seconds until the map may be submitted again, 0 if it is due
+        last = self.last_time.get(mapName)
+        if last is None:
+            return 0.0
+        return max(0.0, last + Settings.auto_submit_interval - now)
+
+    def improved_enough(self, mapName: str, total: float) -> bool:
+        # a new solver starts far below what earlier runs submitted
+        if mapName not in self.last_total:
+            self.last_total[mapName] = best_submitted(mapName)
+        last = self.last_total[mapName]
+        if last is None:
+            return True
+        return total - last > abs(last) * Settings.auto_submit_threshold
+
+    def take(self) -> Dict[str, Dict]:
+        with self.condition:
+            while True:
+                if self.submitting > 0:
+                    # flush is submitting from another thread
+                    self.condition.wait()
+                    continue
+                now = time.monotonic()
+                ready = {}
+                wait = None
+                for mapName, score in list(self.pending.items()):
+                    if not self.improved_enough(mapName, score[SK.gameScore][SK.total]):
+                        continue  # kept in case the next improvement is enough
+                    remaining = self.due(mapName, now)
+                    if remaining == 0.0:
+                        ready[mapName] = self.pending.pop(mapName)
+                    elif wait is None or remaining < wait:
+                        wait = remaining
+                if ready:
+                    self.submitting = len(ready)
+                    return ready
+                self.condition.wait(wait)
+
+    def run(self) -> None:
+        while True:
+            self.submit_all(self.take())
+            with self.condition:
+                self.submitting = 0
+                self.condition.notify_all()
+
+    def submit_all(self, ready: Dict[str, Dict]) -> None:
+        for mapName, score in ready.items():
+            try:
+                self.submit(mapName, score)
+            except Exception as e:
+                print(f"Auto submit of {mapName} failed: {e}")
+
+    def flush(self) -> None:
+        # the thread is a daemon, what is pending at exit is submitted here
+        # without waiting for the interval
+        with self.condition:
+            while self.submitting > 0:
+                self.condition.wait()
+            ready = {
+                mapName: score
+                for mapName, score in self.pending.items()
+                if self.improved_enough(mapName, score[SK.gameScore][SK.total])
+            }
+            self.pending = {}
+            self.submitting = len(ready)
+        try:
+            self.submit_all(ready)
+        finally:
+            with self.condition:
+                self.submitting = 0
+                self.condition.notify_all()
+
+    def submit(self, mapName: str, score: Dict) -> None:
+        digest = solution_hash(score)
+        hashes = self.hashes.setdefault(mapName, set())
+        if digest in hashes:
+            return
+        total = score[SK.gameScore][SK.total]
+        self.last_time[mapName] = time.monotonic()
+        scoredSolution = api.submit(mapName, get_solution(score), apiKey)
+        if not scoredSolution:
+            return
+        hashes.add(digest)
+        self.last_total[mapName] = total
+        server_total = scoredSolution[SK.gameScore][SK.total]
+        # store coalesces improvements, the local game may never be written,
+        # so the submission is recorded by its solution
+        record_submission(mapName, server_total, digest, scoredSolution[SK.gameId])
+        difference = server_total - total
+        print(f"Auto submitted {mapName}\t{server_total}\t({difference:+.2f} vs local)")
+        if abs(difference) > abs(total) * Settings.auto_submit_tolerance:
+            print(f"!! server score for {mapName} differs from the local total {total}")
+
+
+submitter = AutoSubmitter()
+atexit.register(submitter.flush)
+
+
+def offer(mapName: str, score: Dict) -> None:
+    submitter.offer(mapName, score)
+
+
+def flush() -> None:
+    submitter.flush()
@@ -0,0 +1,253 @@
+import argparse
+import contextlib
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from data_keys import (
+    LocationKeys as LK,
+    MapKeys as MK,
+    MapNames as MN,
+)
+from settings import Settings
+
+BENCHMARK_VERSION = 1
+
+Case = Tuple[str, Callable[[], object], int]
+
+
+def measure(function: Callable[[], object], repeat: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "runs": repeat,
+    }
+
+
+def stored_solution(mapName: str) -> Optional[Dict]:
+    from best import best
+    from helper import get_solution
+    from submit import load_game
+
+    try:
+        _, id = best(mapName)
+        return get_solution(load_game(id))
+    except (OSError, ValueError):
+        return None
+
+
+def solver_iteration(mapName: str, mapEntity: Dict, generalData: Dict) -> Callable:
+    from regular_solver import RegularSolver
+    from sandbox_solver import SandboxSolver
+
+    # the caches and the starting score are built here and not timed, one
+    # round of finding and scoring suggestions from the start is
+    if mapName in [MN.gSandbox, MN.sSandbox]:
+        solver = SandboxSolver(mapName, mapEntity, generalData)
+    else:
+        solver = RegularSolver(mapName, mapEntity, generalData)
+    solver.initialize()
+    return solver.find_scored_suggestions
+
+
+def regular_cases(
+    mapName: str, mapEntity: Dict, generalData: Dict, repeat: int
+) -> List[Case]:
+    from helper import build_distance_cache
+    from map_bundle import distance_cache as map_distance_cache
+    from original_scoring import calculateScore as originalCalculateScore
+    from scoring import calculateScore
+
+    distance_cache = map_distance_cache(mapName, mapEntity, generalData)
+    cases: List[Case] = [
+        (
+            "build_distance_cache",
+            lambda: build_distance_cache(mapEntity[LK.locations], generalData),
+            1,
+        ),
+    ]
+    solution = stored_solution(mapName)
+    if solution is not None:
+        cases += [
+            (
+                "scoring",
+                lambda: calculateScore(
+                    mapName, solution, {}, mapEntity, generalData, distance_cache
+                ),
+                repeat,
+            ),
+            (
+                "original_scoring",
+                lambda: originalCalculateScore(
+                    mapName, solution, mapEntity, generalData
+                ),
+                repeat,
+            ),
+        ]
+    cases.append(
+        ("solver_iteration", solver_iteration(mapName, mapEntity, generalData), 1)
+    )
+    return cases
+
+
+def sandbox_cases(
+    mapName: str, mapEntity: Dict, generalData: Dict, repeat: int
+) -> List[Case]:
+    from helper import build_distance_cache
+    from map_limiter import MapLimiter
+    from original_scoring import calculateScore as originalCalculateScore
+    from sandbox_helper import (
+        build_hotspot_cache,
+        find_possible_locations,
+        temporary_names,
+    )
+    from scoring import calculateScore
+
+    map_limiter = MapLimiter(
+        latitudeMin=mapEntity[MK.border][MK.latitudeMin],
+        latitudeMax=mapEntity[MK.border][MK.latitudeMax],
+        longitudeMin=mapEntity[MK.border][MK.longitudeMin],
+        longitudeMax=mapEntity[MK.border][MK.longitudeMax],
+    )
+    hotspot_cache = build_hotspot_cache(mapEntity, generalData)
+    possible_locations = find_possible_locations(hotspot_cache, map_limiter)
+    cases: List[Case] = [
+        (
+            "build_hotspot_cache",
+            lambda: build_hotspot_cache(mapEntity, generalData),
+            1,
+        ),
+        (
+            "find_possible_locations",
+            lambda: find_possible_locations(hotspot_cache, map_limiter),
+            repeat,
+        ),
+        (
+            "build_distance_cache",
+            lambda: build_distance_cache(possible_locations, generalData),
+            1,
+        ),
+    ]
+    solution = stored_solution(mapName)
+    if solution is not None:
+        names = {key: key for key in solution[LK.locations]}
+        distance_cache = build_distance_cache(solution[LK.locations], generalData)
+        cases += [
+            ("temporary_names", lambda: temporary_names(solution, {}), repeat),
+            (
+                "scoring",
+                lambda: calculateScore(
+                    mapName,
+                    solution,
+                    {},
+                    mapEntity,
+                    generalData,
+                    distance_cache,
+                    sandbox_names=names,
+                    inverse_sandbox_names=names,
+                    hotspot_footfall_cache={},
+                ),
+                repeat,
+            ),
+            (
+                "original_scoring",
+                lambda: originalCalculateScore(
+                    mapName, solution, mapEntity, generalData
+                ),
+                repeat,
+            ),
+        ]
+    cases.append(
+        ("solver_iteration", solver_iteration(mapName, mapEntity, generalData), 1)
+    )
+    return cases
+
+
+def run(maps: List[str], repeat: int, cases: Optional[List[str]] = None) -> Dict:
+    from cli import load_data
+
+    results: Dict[str, Dict] = {}
+    for mapName in maps:
+        mapEntity, generalData = load_data(mapName)
+        if mapName in [MN.gSandbox, MN.sSandbox]:
+            map_cases = sandbox_cases(mapName, mapEntity, generalData, repeat)
+        else:
+            map_cases = regular_cases(mapName, mapEntity, generalData, repeat)
+        for name, function, times in map_cases:
+            if cases and name not in cases:
+                continue
+            results[f"{mapName}/{name}"] = measure(function, times)
+            median = results[f"{mapName}/{name}"]["median"]
+            print(f"{mapName}/{name}\t{median * 1000:.2f} ms", file=sys.stderr)
+    return {
+        "version": BENCHMARK_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created": time.time(),
+        "results": results,
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    # medians that got slower than the baseline allows
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        ratio = result["median"] / base["median"] if base["median"] > 0 else 1.0
+        before = base["median"] * 1000
+        after = result["median"] * 1000
+        print(f"{name}\t{before:.2f} -> {after:.2f} ms\t{ratio:.2f}x", file=sys.stderr)
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark scoring and solving")
+    parser.add_argument("maps", nargs="+")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--case", action="append", help="only run these cases")
+    parser.add_argument("--output", help="write the json report here")
+    parser.add_argument("--baseline", default=Settings.benchmark_baseline)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=Settings.benchmark_tolerance)
+    args = parser.parse_args(argv)
+
+    # the code under test prints progress, keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args.maps, args.repeat, args.case)
+    data = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as f:
+            f.write(data)
+    else:
+        print(data)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf8") as f:
+            f.write(data)
+    if args.compare:
+        with open(args.baseline, "r", encoding="utf8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(
+                f"Slower than the baseline: {', '.join(regressions)}", file=sys.stderr
+            )
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
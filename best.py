@@ -1,19 +1,131 @@
+import atexit
+import heapq
+import json
+import os
 import sys
-from typing import Tuple
+import threading
+import time
+from typing import Dict, List, Set, Tuple
 
 from settings import Settings
 
 
+class BestIndex:
+    def __init__(self) -> None:
+        # mapName -> (total, id, offset into the log that has been read)
+        self.entries: Dict[str, Tuple[float, str, int]] = {}
+        # maps whose sidecar is behind the entry, and when it was last written
+        self.dirty: Set[str] = set()
+        self.saved: Dict[str, float] = {}
+
+    def log_path(self, mapName: str) -> str:
+        return f"{Settings.log_folder}/{mapName}.txt"
+
+    def sidecar_path(self, mapName: str) -> str:
+        return f"{Settings.log_folder}/{mapName}.best"
+
+    def best(self, mapName: str) -> Tuple[float, str]:
+        entry = self.entries.get(mapName)
+        if entry is None:
+            entry = self.read_sidecar(mapName)
+        entry = self.tail(mapName, entry)
+        if entry[1] == "":
+            raise ValueError(f"No scores logged for {mapName}")
+        return entry[0], entry[1]
+
+    def record(self, mapName: str, total: float, id: str) -> None:
+        # called by store after appending to the log, the offset is left alone
+        # so the line is read again by tail, which is harmless
+        entry = self.entries.get(mapName)
+        if entry is None:
+            entry = self.read_sidecar(mapName)
+        if (total, id) > entry[:2]:
+            entry = (total, id, entry[2])
+            self.entries[mapName] = entry
+            # a stale sidecar only means more of the log is read by tail,
+            # so it is written at most every best_sidecar_interval and by save
+            self.dirty.add(mapName)
+            now = time.monotonic()
+            if now - self.saved.get(mapName, 0.0) > Settings.best_sidecar_interval:
+                self.write_sidecar(mapName, entry)
+
+    def save(self) -> None:
+        for mapName in list(self.dirty):
+            self.write_sidecar(mapName, self.entries[mapName])
+
+    def tail(
+        self, mapName: str, entry: Tuple[float, str, int]
+    ) -> Tuple[float, str, int]:
+        size = os.path.getsize(self.log_path(mapName))
+        total, id, offset = entry
+        if size == offset:
+            self.entries[mapName] = entry
+            return entry
+        if size < offset:
+            # the log has been truncated or replaced, start over
+            total, id, offset = (float("-inf"), "", 0)
+        with open(self.log_path(mapName), "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # only complete lines, a writer might be busy
+        for line in data[:end].decode("utf8").splitlines():
+            parts = line.rstrip().split(" ")
+            if len(parts) < 2:
+                continue
+            candidate = (float(parts[0]), parts[1])
+            if candidate > (total, id):
+                total, id = candidate
+        entry = (total, id, offset + end)
+        self.entries[mapName] = entry
+        if end > 0:
+            self.write_sidecar(mapName, entry)
+        return entry
+
+    def read_sidecar(self, mapName: str) -> Tuple[float, str, int]:
+        try:
+            with open(self.sidecar_path(mapName), "r", encoding="utf8") as f:
+                data = json.load(f)
+            return (data["total"], data["id"], data["offset"])
+        except (OSError, ValueError, KeyError):
+            return (float("-inf"), "", 0)
+
+    def write_sidecar(self, mapName: str, entry: Tuple[float, str, int]) -> None:
+        self.dirty.discard(mapName)
+        self.saved[mapName] = time.monotonic()
+        path = self.sidecar_path(mapName)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf8") as f:
+            json.dump({"total": entry[0], "id": entry[1], "offset": entry[2]}, f)
+        os.replace(temporary, path)
+
+
+index = BestIndex()
+atexit.register(index.save)
+
+
 def best(mapName: str) -> Tuple[float, str]:
-    path = f"{Settings.log_folder}/{mapName}.txt"
-    with open(path, "r", encoding="utf8") as f:
+    if Settings.store_backend == "sqlite":
+        import database
+
+        entry = database.best(mapName)
+        if entry is None:
+            raise ValueError(f"No scores stored for {mapName}")
+        return entry
+    return index.best(mapName)
+
+
+def top(mapName: str, k: int) -> List[Tuple[float, str]]:
+    if Settings.store_backend == "sqlite":
+        import database
+
+        return database.top(mapName, k)
+    with open(index.log_path(mapName), "r", encoding="utf8") as f:
         scores = []
-        for line in f.readlines():
+        for line in f:
             parts = line.rstrip().split(" ")
-            score = float(parts[0])
-            id = parts[1]
-            scores.append((score, id))
-    return max(scores)
+            if len(parts) >= 2:
+                scores.append((float(parts[0]), parts[1]))
+    return heapq.nlargest(k, scores)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from data_keys import ALL_MAPS
+from settings import Settings
+
+# the subcommands import what they need, so that quick ones start fast
+
+PASS_THROUGH = ["bench", "fuzz", "profile", "components"]
+
+
+def map_name(value: str) -> str:
+    if value not in ALL_MAPS:
+        raise argparse.ArgumentTypeError(f"unknown map {value}")
+    return value
+
+
+def load_data(mapName: str) -> Tuple[Dict, Dict]:
+    # read the cache directly, the api is only imported when data is missing
+    paths = [
+        f"{Settings.cache_folder}/{mapName}.json",
+        f"{Settings.cache_folder}/general.json",
+    ]
+    if not all(os.path.exists(path) for path in paths):
+        from api import getGeneralData, getMapData
+
+        os.makedirs(Settings.cache_folder, exist_ok=True)
+        mapEntity = getMapData(
+            mapName, os.environ.get("apiKey", ""), Settings.cache_folder
+        )
+        generalData = getGeneralData(Settings.cache_folder)
+        if not mapEntity or not generalData:
+            raise SystemExit("ERR Missing data")
+    data = []
+    for path in paths:
+        with open(path, "r", encoding="utf8") as f:
+            data.append(json.load(f))
+    return data[0], data[1]
+
+
+def cmd_solve(args: argparse.Namespace) -> int:
+    from main import main
+
+    for mapName in args.maps:
+        main(mapName)
+    return 0
+
+
+def cmd_jiggle(args: argparse.Namespace) -> int:
+    if args.method == "plain":
+        from jiggle import jiggle
+    elif args.method == "fast":
+        from fast_jiggle import jiggle
+    else:
+        from alt_jiggle_sandbox import jiggle
+    jiggle(args.map)
+    return 0
+
+
+def cmd_anneal(args: argparse.Namespace) -> int:
+    from annealing import anneal
+
+    for mapName in args.maps:
+        anneal(mapName, args.seconds)
+    return 0
+
+
+def cmd_orchestrate(args: argparse.Namespace) -> int:
+    from orchestrate import Orchestrator
+
+    duration = args.hours * 3600 if args.hours else None
+    Orchestrator(args.maps, args.seconds, args.workers).run(duration)
+    return 0
+
+
+def cmd_rescore(args: argparse.Namespace) -> int:
+    from rescore import verify
+
+    for id in args.ids:
+        verify(id)
+    return 0
+
+
+def cmd_best(args: argparse.Namespace) -> int:
+    from best import best, top
+
+    for mapName in args.maps:
+        try:
+            if args.top > 1:
+                entries = top(mapName, args.top)
+            else:
+                entries = [best(mapName)]
+        except (OSError, ValueError):
+            if len(args.maps) == 1:
+                print(f"No scores logged for {mapName}")
+                return 1
+            continue
+        for total, id in entries:
+            print(f"{mapName}\t{total}\t{id}")
+    return 0
+
+
+def cmd_submit(args: argparse.Namespace) -> int:
+    if args.id:
+        from submit import submit
+
+        submit(args.id)
+        return 0
+    from submit_all import submit_all
+
+    submit_all(args.maps, args.top, args.workers, args.rate)
+    return 0
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    from benchmark import main
+
+    return main(args.args)
+
+
+def cmd_fuzz(args: argparse.Namespace) -> int:
+    from fuzz import main
+
+    return main(args.args)
+
+
+def cmd_profile(args: argparse.Namespace) -> int:
+    from profiler import main
+
+    return main(args.args)
+
+
+def cmd_components(args: argparse.Namespace) -> int:
+    from components import main
+
+    return main(args.args)
+
+
+def parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Solve, inspect and submit maps")
+    parser.add_argument(
+        "--backend",
+        choices=["files", "sqlite", "archive"],
+        help="override Settings.store_backend",
+    )
+    parser.add_argument(
+        "--instrument",
+        action="store_true",
+        help="record per action counts and timings in the log folder",
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="track allocations per action as well, with tracemalloc",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    solve = commands.add_parser("solve", help="run the solver")
+    solve.add_argument("maps", nargs="+", type=map_name)
+    solve.set_defaults(run=cmd_solve)
+
+    jiggle = commands.add_parser("jiggle", help="jiggle the best game")
+    jiggle.add_argument("map", type=map_name)
+    jiggle.add_argument(
+        "--method", choices=["plain", "fast", "sandbox"], default="fast"
+    )
+    jiggle.set_defaults(run=cmd_jiggle)
+
+    anneal = commands.add_parser("anneal", help="anneal the best game")
+    anneal.add_argument("maps", nargs="+", type=map_name)
+    anneal.add_argument("--seconds", type=float)
+    anneal.set_defaults(run=cmd_anneal)
+
+    orchestrate = commands.add_parser("orchestrate", help="anneal maps in a pool")
+    orchestrate.add_argument("maps", nargs="*", type=map_name, default=ALL_MAPS)
+    orchestrate.add_argument(
+        "--seconds", type=float, default=Settings.orchestrate_slice
+    )
+    orchestrate.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    orchestrate.add_argument("--hours", type=float, help="stop after this long")
+    orchestrate.set_defaults(run=cmd_orchestrate)
+
+    rescore = commands.add_parser("rescore", help="score games with the original")
+    rescore.add_argument("ids", nargs="+")
+    rescore.set_defaults(run=cmd_rescore)
+
+    best = commands.add_parser("best", help="print the best logged games")
+    best.add_argument("maps", nargs="*", type=map_name, default=ALL_MAPS)
+    best.add_argument("--top", type=int, default=1)
+    best.set_defaults(run=cmd_best)
+
+    submit = commands.add_parser("submit", help="submit games")
+    submit.add_argument("maps", nargs="*", type=map_name, default=ALL_MAPS)
+    submit.add_argument("--id", help="submit this game instead")
+    submit.add_argument("--top", type=int, default=1, help="games per map")
+    submit.add_argument("--workers", type=int, default=Settings.submit_workers)
+    submit.add_argument("--rate", type=float, default=Settings.submit_rate)
+    submit.set_defaults(run=cmd_submit)
+
+    bench = commands.add_parser(
+        "bench", help="benchmark suite, see benchmark.py --help", add_help=False
+    )
+    bench.add_argument("args", nargs=argparse.REMAINDER)
+    bench.set_defaults(run=cmd_bench)
+
+    fuzz = commands.add_parser(
+        "fuzz", help="compare the scorers, see fuzz.py --help", add_help=False
+    )
+    fuzz.add_argument("args", nargs=argparse.REMAINDER)
+    fuzz.set_defaults(run=cmd_fuzz)
+
+    profile = commands.add_parser(
+        "profile", help="profile and compare, see profiler.py --help", add_help=False
+    )
+    profile.add_argument("args", nargs=argparse.REMAINDER)
+    profile.set_defaults(run=cmd_profile)
+
+    components = commands.add_parser(
+        "components",
+        help="solve a regular map by components, see components.py --help",
+        add_help=False,
+    )
+    components.add_argument("args", nargs=argparse.REMAINDER)
+    components.set_defaults(run=cmd_components)
+    return parser
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    # these parse their own options, argparse would take the leading ones
+    split = next((i for i, arg in enumerate(argv) if arg in PASS_THROUGH), None)
+    if split is None:
+        args = parser().parse_args(argv)
+    else:
+        args = parser().parse_args(argv[: split + 1])
+        args.args = argv[split + 1 :]
+    if args.backend:
+        Settings.store_backend = args.backend
+    if args.instrument:
+        Settings.instrument = True
+    if args.memory:
+        Settings.instrument_memory = True
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(run())
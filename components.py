@@ -0,0 +1,297 @@
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from data_keys import LocationKeys as LK, MapNames as MN
+from events import emit
+from incremental_scoring import RegularState, ScoreConstants
+from settings import Settings
+
+# every (f3100, f9100) a location can have, (0, 0) leaves it out
+CONFIGURATIONS = [
+    (f3, f9)
+    for f3 in range(Settings.max_stations + 1)
+    for f9 in range(Settings.max_stations + 1)
+]
+
+Counts = Dict[str, Tuple[int, int]]
+
+
+def find_components(distance_cache: Dict[str, Dict]) -> List[List[str]]:
+    # connected components of the neighbour graph, largest first
+    seen = set()
+    components = []
+    for start in distance_cache:
+        if start in seen:
+            continue
+        seen.add(start)
+        component = [start]
+        i = 0
+        while i < len(component):
+            for nkey in distance_cache[component[i]]:
+                if nkey not in seen:
+                    seen.add(nkey)
+                    component.append(nkey)
+            i += 1
+        components.append(component)
+    components.sort(key=len, reverse=True)
+    return components
+
+
+def objective(
+    value: float, footfall: float, rest_value: float, rest_footfall: float
+) -> float:
+    # the total with the rest of the map fixed, the footfall multiplier is
+    # the only coupling between components
+    return (rest_value + value) * (1 + rest_footfall + footfall)
+
+
+def best_active_counts(
+    constants: ScoreConstants, sales_volume: float
+) -> Tuple[Tuple[int, int], float]:
+    # the best configuration of a location without neighbours once it is
+    # used, its footfall is the same for all of them
+    sales = round(sales_volume, 0)
+    return max(
+        (
+            ((f3, f9), constants.value(sales, f3, f9, False))
+            for f3, f9 in CONFIGURATIONS[1:]
+        ),
+        key=lambda option: option[1],
+    )
+
+
+def isolated_counts(
+    constants: ScoreConstants,
+    sales_volume: float,
+    footfall: float,
+    rest_value: float,
+    rest_footfall: float,
+) -> Tuple[int, int]:
+    # without neighbours the sales and footfall of a location are its own,
+    # so it is either left out or gets its best configuration
+    counts, value = best_active_counts(constants, sales_volume)
+    used = objective(value, footfall / 1000, rest_value, rest_footfall)
+    if used > objective(0.0, 0.0, rest_value, rest_footfall):
+        return counts
+    return (0, 0)
+
+
+def descend(state: RegularState, rest_value: float, rest_footfall: float) -> None:
+    # coordinate descent over the configurations of each location
+    keys = list(state.base_sales)
+    best = objective(state.value_sum, state.footfall_sum, rest_value, rest_footfall)
+    improved = True
+    while improved:
+        improved = False
+        for key in keys:
+            current = state.get_counts(key)
+            choice = current
+            for counts in CONFIGURATIONS:
+                if counts == current:
+                    continue
+                state.set_counts(key, *counts)
+                total = objective(
+                    state.value_sum, state.footfall_sum, rest_value, rest_footfall
+                )
+                if total > best:
+                    best, choice = total, counts
+            state.set_counts(key, *choice)
+            if choice != current:
+                improved = True
+        state.resync()
+        best = objective(state.value_sum, state.footfall_sum, rest_value, rest_footfall)
+
+
+def solve_component(
+    task: Tuple[Dict, Dict, Dict, Dict, float, float],
+) -> Tuple[Counts, float]:
+    # runs in a worker, the component is a map of its own
+    mapEntity, generalData, distance_cache, solution, rest_value, rest_footfall = task
+    state = RegularState(mapEntity, generalData, distance_cache, solution)
+    descend(state, rest_value, rest_footfall)
+    counts = {key: state.get_counts(key) for key in mapEntity[LK.locations]}
+    return counts, objective(
+        state.value_sum, state.footfall_sum, rest_value, rest_footfall
+    )
+
+
+class Decomposition:
+    def __init__(
+        self,
+        mapEntity: Dict,
+        generalData: Dict,
+        distance_cache: Dict[str, Dict],
+        solution: Dict[str, Dict],
+    ) -> None:
+        self.mapEntity = mapEntity
+        self.generalData = generalData
+        self.distance_cache = distance_cache
+        self.state = RegularState(mapEntity, generalData, distance_cache, solution)
+        components = find_components(distance_cache)
+        self.isolated = [c[0] for c in components if len(c) == 1]
+        self.components = [c for c in components if len(c) > 1]
+
+    def rest(self, keys: List[str]) -> Tuple[float, float]:
+        state = self.state
+        value = sum(state.values.get(key, 0.0) for key in keys)
+        footfall = sum(state.footfalls.get(key, 0.0) for key in keys)
+        return state.value_sum - value, state.footfall_sum - footfall
+
+    def solve_isolated(self) -> int:
+        # exact, each choice sees the choices made before it
+        changed = 0
+        for key in self.isolated:
+            rest_value, rest_footfall = self.rest([key])
+            counts = isolated_counts(
+                self.state.constants,
+                self.state.base_sales[key],
+                self.state.footfall[key],
+                rest_value,
+                rest_footfall,
+            )
+            if counts != self.state.get_counts(key):
+                self.state.set_counts(key, *counts)
+                changed += 1
+        return changed
+
+    def task(self, component: List[str]) -> Tuple[Dict, Dict, Dict, Dict, float, float]:
+        locations = self.mapEntity[LK.locations]
+        mapEntity = {LK.locations: {key: locations[key] for key in component}}
+        distance_cache = {key: self.distance_cache[key] for key in component}
+        solution = {
+            LK.locations: {
+                key: {LK.f3100Count: f3, LK.f9100Count: f9}
+                for key in component
+                for f3, f9 in [self.state.get_counts(key)]
+                if f3 > 0 or f9 > 0
+            }
+        }
+        rest_value, rest_footfall = self.rest(component)
+        return (
+            mapEntity,
+            self.generalData,
+            distance_cache,
+            solution,
+            rest_value,
+            rest_footfall,
+        )
+
+    def apply(self, counts: Counts) -> bool:
+        # keep a component solution only if the whole map gains
+        before = self.state.total
+        old = {key: self.state.get_counts(key) for key in counts}
+        if old == counts:
+            return False
+        for key, (f3, f9) in counts.items():
+            self.state.set_counts(key, f3, f9)
+        if self.state.total > before:
+            return True
+        for key, (f3, f9) in old.items():
+            self.state.set_counts(key, f3, f9)
+        return False
+
+    def solve(self, workers: int, rounds: int) -> Dict[str, Dict]:
+        emit(
+            "components",
+            components=len(self.components),
+            largest=len(self.components[0]) if self.components else 0,
+            isolated=len(self.isolated),
+        )
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for round in range(rounds):
+                changed = self.solve_isolated()
+                # the components are solved against the same rest of the map,
+                # then applied one by one, the biggest local gain first
+                tasks = [self.task(component) for component in self.components]
+                results = list(executor.map(solve_component, tasks, chunksize=8))
+                gains = [
+                    (total - self.state.total, counts) for (counts, total) in results
+                ]
+                gains.sort(key=lambda gain: gain[0], reverse=True)
+                for _, counts in gains:
+                    changed += self.apply(counts)
+                self.state.resync()
+                emit(
+                    "components_round",
+                    round=round + 1,
+                    changed=changed,
+                    total=self.state.total,
+                )
+                if changed == 0:
+                    break
+        return self.state.solution()
+
+
+def decompose(
+    mapName: str,
+    mapEntity: Dict,
+    generalData: Dict,
+    distance_cache: Dict[str, Dict],
+    solution: Dict[str, Dict],
+) -> Dict[str, Dict]:
+    if mapName in [MN.gSandbox, MN.sSandbox]:
+        raise ValueError("Sandbox maps have no fixed neighbours to decompose")
+    decomposition = Decomposition(mapEntity, generalData, distance_cache, solution)
+    return decomposition.solve(Settings.components_workers, Settings.components_rounds)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from cli import load_data, map_name
+    from map_bundle import distance_cache as map_distance_cache
+    from original_scoring import calculateScore as originalCalculateScore
+    from scoring import calculateScore
+    from store import failures, flush, store
+    from suggestion import get_total
+
+    parser = argparse.ArgumentParser(
+        description="Solve a regular map component by component"
+    )
+    parser.add_argument("map", type=map_name)
+    parser.add_argument("--workers", type=int, default=Settings.components_workers)
+    parser.add_argument("--rounds", type=int, default=Settings.components_rounds)
+    parser.add_argument(
+        "--from-best", action="store_true", help="start from the best stored game"
+    )
+    args = parser.parse_args(argv)
+
+    mapEntity, generalData = load_data(args.map)
+    distance_cache = map_distance_cache(args.map, mapEntity, generalData)
+    solution: Optional[Dict] = None
+    if args.from_best:
+        from benchmark import stored_solution
+
+        solution = stored_solution(args.map)
+    if solution is None:
+        solution = {
+            LK.locations: {
+                key: {LK.f3100Count: 1, LK.f9100Count: 0}
+                for key in mapEntity[LK.locations]
+            }
+        }
+    decomposition = Decomposition(mapEntity, generalData, distance_cache, solution)
+    solution = decomposition.solve(args.workers, args.rounds)
+
+    # the combined solution is checked against the reference before storing
+    verification = get_total(
+        originalCalculateScore(args.map, solution, mapEntity, generalData)
+    )
+    total = decomposition.state.total
+    if abs(verification - total) > 1e-6 * max(1.0, abs(verification)):
+        print(f"Verification failed: {total} != {verification}", file=sys.stderr)
+        return 1
+    score = calculateScore(
+        args.map, solution, {}, mapEntity, generalData, distance_cache
+    )
+    store(args.map, score)
+    flush()
+    if failures() > 0:
+        print(f"Failed to store the game for {args.map}", file=sys.stderr)
+        return 1
+    print(f"{verification}\t{len(solution[LK.locations])} locations")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,9 @@ class MapNames:
     gSandbox = "g-sandbox"
 
 
+ALL_MAPS = [name for key, name in vars(MapNames).items() if not key.startswith("_")]
+
+
 @dataclass
 class LocationKeys:
     locations = "locations"
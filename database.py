@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from data_keys import (
+    LocationKeys as LK,
+    ScoringKeys as SK,
+)
+from helper import get_solution
+from settings import Settings
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id TEXT PRIMARY KEY,
+    map TEXT NOT NULL,
+    total REAL NOT NULL,
+    co2 REAL,
+    footfall REAL,
+    earnings REAL,
+    solution TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_map_total ON games (map, total DESC);
+CREATE TABLE IF NOT EXISTS best (
+    map TEXT PRIMARY KEY,
+    total REAL NOT NULL,
+    id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    map TEXT NOT NULL,
+    total REAL NOT NULL,
+    id TEXT NOT NULL,
+    game_id TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submissions_map ON submissions (map, id);
+"""
+
+local = threading.local()
+
+
+def connect() -> sqlite3.Connection:
+    # one connection per thread, the store writer runs in its own thread
+    connection = getattr(local, "connection", None)
+    if connection is None:
+        connection = sqlite3.connect(Settings.database, timeout=30.0)
+        # WAL lets several jiggle processes write while others read
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        local.connection = connection
+    return connection
+
+
+def game_row(mapName: str, score: Dict) -> Tuple:
+    game_score = score[SK.gameScore]
+    return (
+        score[SK.gameId],
+        mapName,
+        game_score[SK.total],
+        game_score.get(SK.co2Savings),
+        game_score.get(SK.totalFootfall),
+        game_score.get(SK.earnings),
+        json.dumps(get_solution(score)[LK.locations], separators=(",", ":")),
+        time.time(),
+    )
+
+
+def save_games(mapName: str, scores: List[Dict]) -> None:
+    connection = connect()
+    with connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [game_row(mapName, score) for score in scores],
+        )
+        top = max(scores, key=lambda score: score[SK.gameScore][SK.total])
+        connection.execute(
+            "INSERT INTO best VALUES (?, ?, ?) ON CONFLICT(map) DO UPDATE "
+            "SET total = excluded.total, id = excluded.id "
+            "WHERE excluded.total > best.total",
+            (mapName, top[SK.gameScore][SK.total], top[SK.gameId]),
+        )
+
+
+def load_game(id: str) -> Optional[Dict]:
+    row = (
+        connect()
+        .execute(
+            "SELECT map, total, co2, footfall, earnings, solution FROM games WHERE id = ?",
+            (id,),
+        )
+        .fetchone()
+    )
+    if row is None:
+        return None
+    mapName, total, co2, footfall, earnings, solution = row
+    return {
+        SK.gameId: id,
+        SK.mapName: mapName,
+        LK.locations: json.loads(solution),
+        SK.gameScore: {
+            SK.co2Savings: co2,
+            SK.totalFootfall: footfall,
+            SK.earnings: earnings,
+            SK.total: total,
+        },
+    }
+
+
+def best(mapName: str) -> Optional[Tuple[float, str]]:
+    row = (
+        connect()
+        .execute("SELECT total, id FROM best WHERE map = ?", (mapName,))
+        .fetchone()
+    )
+    if row is None:
+        return None
+    return row[0], row[1]
+
+
+def top(mapName: str, k: int) -> List[Tuple[float, str]]:
+    return (
+        connect()
+        .execute(
+            "SELECT total, id FROM games WHERE map = ? ORDER BY total DESC LIMIT ?",
+            (mapName, k),
+        )
+        .fetchall()
+    )
+
+
+def record_submission(mapName: str, total: float, id: str, game_id: str) -> None:
+    connection = connect()
+    with connection:
+        connection.execute(
+            "INSERT INTO submissions VALUES (?, ?, ?, ?, ?)",
+            (mapName, total, id, game_id, time.time()),
+        )
+
+
+def submitted(mapName: str) -> Set[str]:
+    rows = connect().execute("SELECT id FROM submissions WHERE map = ?", (mapName,))
+    return {row[0] for row in rows}
+
+
+def best_submitted(mapName: str) -> Optional[float]:
+    row = (
+        connect()
+        .execute("SELECT MAX(total) FROM submissions WHERE map = ?", (mapName,))
+        .fetchone()
+    )
+    return row[0]
+
+
+def read_log(path: str) -> Iterable[Tuple[float, str]]:
+    with open(path, "r", encoding="utf8") as f:
+        for line in f:
+            parts = line.rstrip().split(" ")
+            if len(parts) >= 2:
+                yield float(parts[0]), parts[1]
+
+
+def import_files() -> None:
+    # one-shot import of my_games and log into the database
+    connection = connect()
+    imported = 0
+    missing = 0
+    for name in sorted(os.listdir(Settings.log_folder)):
+        if not name.endswith(".txt") or name == "submit.txt":
+            continue
+        mapName = name[: -len(".txt")]
+        scores = []
+        for _, id in read_log(f"{Settings.log_folder}/{name}"):
+            path = f"{Settings.game_folder}/{id}.json"
+            if not os.path.exists(path):
+                missing += 1
+                continue
+            with open(path, "r", encoding="utf8") as f:
+                scores.append(json.load(f))
+            if len(scores) >= 1000:
+                save_games(mapName, scores)
+                imported += len(scores)
+                scores = []
+        if scores:
+            save_games(mapName, scores)
+            imported += len(scores)
+        print(f"{mapName}: {best(mapName)}")
+
+    submit_log = f"{Settings.log_folder}/submit.txt"
+    already = connection.execute("SELECT COUNT(*) FROM submissions").fetchone()[0]
+    if os.path.exists(submit_log) and already == 0:
+        with open(submit_log, "r", encoding="utf8") as f:
+            rows = [line.split() for line in f if line.strip()]
+        with connection:
+            connection.executemany(
+                "INSERT INTO submissions VALUES (?, ?, ?, ?, ?)",
+                [(row[0], float(row[1]), row[2], row[3], 0.0) for row in rows],
+            )
+        print(f"{len(rows)} submissions")
+    print(f"{imported} games imported, {missing} missing game files")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "import":
+        import_files()
+    else:
+        print("Wrong number of arguments")
@@ -0,0 +1,102 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+from settings import Settings
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+
+def console_line(event: str, fields: Dict[str, Any]) -> str:
+    # nested fields like changes are only in the jsonl file
+    values = [
+        f"{key}={value}"
+        for key, value in fields.items()
+        if not isinstance(value, (dict, list))
+    ]
+    return " ".join([event] + values)
+
+
+class EventStream:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.buffer: List[str] = []
+        self.last_flush = time.monotonic()
+        # event -> last console print and the prints skipped since
+        self.last_console: Dict[str, float] = {}
+        self.skipped: Dict[str, int] = {}
+
+    def emit(self, event: str, level: str = "info", **fields: Any) -> None:
+        rank = LEVELS[level]
+        to_file = Settings.events and rank >= LEVELS[Settings.events_level]
+        to_console = rank >= LEVELS[Settings.events_console_level]
+        if not to_file and not to_console:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if to_file:
+                record = {"time": time.time(), "event": event, "level": level}
+                record.update(fields)
+                self.buffer.append(json.dumps(record, default=str))
+                if (
+                    len(self.buffer) >= Settings.events_buffer
+                    or now - self.last_flush > Settings.events_flush_interval
+                ):
+                    self.write()
+            if to_console:
+                self.console(event, rank, fields, now)
+
+    def console(
+        self, event: str, rank: int, fields: Dict[str, Any], now: float
+    ) -> None:
+        # at most one line per event and interval, warnings always get through
+        last = self.last_console.get(event)
+        if (
+            rank < LEVELS["warning"]
+            and last is not None
+            and now - last < Settings.events_console_interval
+        ):
+            self.skipped[event] = self.skipped.get(event, 0) + 1
+            return
+        line = console_line(event, fields)
+        skipped = self.skipped.pop(event, 0)
+        if skipped:
+            line += f" (+{skipped} more)"
+        self.last_console[event] = now
+        print(line)
+
+    def write(self) -> None:
+        # the lock is held, one write call per flush keeps lines whole
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        data = "\n".join(self.buffer) + "\n"
+        self.buffer = []
+        os.makedirs(Settings.log_folder, exist_ok=True)
+        try:
+            with open(
+                f"{Settings.log_folder}/{Settings.events_file}", "a", encoding="utf8"
+            ) as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Failed to write events: {e}", file=sys.stderr)
+
+    def flush(self) -> None:
+        with self.lock:
+            self.write()
+
+
+stream = EventStream()
+atexit.register(stream.flush)
+
+
+def emit(event: str, level: str = "info", **fields: Any) -> None:
+    stream.emit(event, level, **fields)
+
+
+def flush() -> None:
+    stream.flush()
@@ -1,16 +1,19 @@
 import os
 import random
 import sys
+import time
 from typing import Dict
 from data_keys import (
     MapNames as MN,
     MapKeys as MK,
     LocationKeys as LK,
     CoordinateKeys as CK,
+    ScoringKeys as SK,
 )
 from dotenv import load_dotenv
 from api import getGeneralData, getMapData
 from helper import build_distance_cache
+from map_bundle import distance_cache as map_distance_cache
 from map_limiter import MapLimiter
 from scoring import calculateScore
 
@@ -19,10 +22,11 @@ from best import best
 from store import store
 from submit import get_solution, load_game
 from suggestion import get_total
+from undo_log import UndoLog
 
 
 load_dotenv()
-apiKey = os.environ["apiKey"]
+apiKey = os.environ.get("apiKey", "")
 
 
 def jiggle_sandbox(
@@ -33,14 +37,23 @@ def jiggle_sandbox(
     mapLimiter: MapLimiter,
     sandbox_names: Dict[str, str],
     hotspot_footfall_cache: Dict,
+    log: UndoLog,
 ) -> Dict:
     max_step_factor = 0.001
     step_lat = mapLimiter.latitudeDiff * max_step_factor * 2 * (random.random() - 0.5)
     step_long = mapLimiter.longitudeDiff * max_step_factor * 2 * (random.random() - 0.5)
     key = random.choice(list(solution[LK.locations].keys()))
     location = solution[LK.locations][key]
-    location[CK.latitude] = mapLimiter.latitude(location[CK.latitude] + step_lat)
-    location[CK.longitude] = mapLimiter.longitude(location[CK.longitude] + step_long)
+    log.set(
+        location,
+        CK.latitude,
+        mapLimiter.latitude(location[CK.latitude] + step_lat),
+    )
+    log.set(
+        location,
+        CK.longitude,
+        mapLimiter.longitude(location[CK.longitude] + step_long),
+    )
     distance_cache = build_distance_cache(solution[LK.locations], generalData)
     return calculateScore(
         mapName,
@@ -56,20 +69,20 @@ def jiggle_sandbox(
     )
 
 
-def increase(location):
+def increase(location, log: UndoLog):
     if location[LK.f3100Count] < Settings.max_stations:
-        location[LK.f3100Count] += 1
+        log.set(location, LK.f3100Count, location[LK.f3100Count] + 1)
     elif location[LK.f9100Count] < Settings.max_stations:
-        location[LK.f3100Count] = 0
-        location[LK.f9100Count] += 1
+        log.set(location, LK.f3100Count, 0)
+        log.set(location, LK.f9100Count, location[LK.f9100Count] + 1)
 
 
-def decrease(location):
+def decrease(location, log: UndoLog):
     if location[LK.f3100Count] > 0:
-        location[LK.f3100Count] -= 1
+        log.set(location, LK.f3100Count, location[LK.f3100Count] - 1)
     elif location[LK.f9100Count] > 0:
-        location[LK.f9100Count] -= 1
-        location[LK.f3100Count] = 2
+        log.set(location, LK.f9100Count, location[LK.f9100Count] - 1)
+        log.set(location, LK.f3100Count, 2)
 
 
 def jiggle_regular(
@@ -78,6 +91,7 @@ def jiggle_regular(
     mapEntity: Dict,
     generalData: Dict,
     distance_cache: Dict[str, Dict],
+    log: UndoLog,
 ) -> Dict:
     coin_toss = random.random()
     if coin_toss <= 0.4:
@@ -86,18 +100,22 @@ def jiggle_regular(
         key = random.choice(list(mapEntity[LK.locations].keys()))
 
     if key not in solution[LK.locations]:
-        solution[LK.locations][key] = {
-            LK.f3100Count: 0,
-            LK.f9100Count: 0,
-        }
+        log.set(
+            solution[LK.locations],
+            key,
+            {
+                LK.f3100Count: 0,
+                LK.f9100Count: 0,
+            },
+        )
     location = solution[LK.locations][key]
 
     if coin_toss > 0.4:
-        increase(location)
+        increase(location, log)
     else:
-        decrease(location)
+        decrease(location, log)
         if location[LK.f3100Count] == location[LK.f9100Count] == 0:
-            del solution[LK.locations][key]
+            log.delete(solution[LK.locations], key)
     return calculateScore(
         mapName, solution, {}, mapEntity, generalData, distance_cache, round_total=False
     )
@@ -124,7 +142,10 @@ def jiggle(mapName: str) -> None:
         sandbox_names = {key: key for key in solution[LK.locations].keys()}
         hotspot_footfall_cache: Dict = {}
     else:
-        distance_cache = build_distance_cache(mapEntity[LK.locations], generalData)
+        distance_cache = map_distance_cache(mapName, mapEntity, generalData)
+    # mutations since the best solution, rolled back instead of reloading the game
+    log = UndoLog()
+    last_sync = time.perf_counter()
 
     while True:
         if mapName in [MN.gSandbox, MN.sSandbox]:
@@ -136,10 +157,11 @@ def jiggle(mapName: str) -> None:
                 mapLimiter,
                 sandbox_names,
                 hotspot_footfall_cache,
+                log,
             )
         else:
             score = jiggle_regular(
-                mapName, solution, mapEntity, generalData, distance_cache
+                mapName, solution, mapEntity, generalData, distance_cache, log
             )
 
         new_total = get_total(score)
@@ -147,16 +169,22 @@ def jiggle(mapName: str) -> None:
             print("")
             store(mapName, score)
             total = new_total
+            id = score[SK.gameId]
+            log.commit()
         elif abs(new_total - total) < 16.0:
             # print("+", end="", flush=True)
             pass
         else:
             # print("_", end="", flush=True)
-            total, new_id = best(mapName)
-            if id != new_id:
-                print(total)
-                id = new_id
-            solution = get_solution(load_game(id))
+            log.rollback()
+            if time.perf_counter() - last_sync > Settings.jiggle_sync_interval:
+                # pick up improvements from other processes now and then
+                last_sync = time.perf_counter()
+                best_total, best_id = best(mapName)
+                if best_total > total:
+                    print(best_total)
+                    total, id = best_total, best_id
+                    solution = get_solution(load_game(id))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,502 @@
+import argparse
+import contextlib
+import copy
+import json
+import math
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from data_keys import (
+    CoordinateKeys as CK,
+    GeneralKeys as GK,
+    HotspotKeys as HK,
+    LocationKeys as LK,
+    MapKeys as MK,
+    MapNames as MN,
+    ScoringKeys as SK,
+)
+from helper import apply_change, build_distance_cache
+from settings import KW, Settings
+
+
+# an engine returns the total and, when it has them, the scored locations
+Result = Tuple[float, Optional[Dict[str, Dict]]]
+Engine = Callable[[Dict], Optional[Result]]
+
+COUNTS = [(f3, f9) for f3 in range(3) for f9 in range(3) if f3 > 0 or f9 > 0]
+
+
+def applied_solution(case: Dict) -> Dict[str, Dict]:
+    solution = copy.deepcopy(case["solution"])
+    apply_change(solution[LK.locations], case["change"])
+    return solution
+
+
+def score_result(score: Dict) -> Result:
+    return score[SK.gameScore][SK.total], score[LK.locations]
+
+
+class RegularTarget:
+    def __init__(
+        self,
+        mapName: str,
+        mapEntity: Dict,
+        generalData: Dict,
+        distance_cache: Dict[str, Dict],
+    ) -> None:
+        self.mapName = mapName
+        self.mapEntity = mapEntity
+        self.generalData = generalData
+        self.distance_cache = distance_cache
+        self.keys = list(mapEntity[LK.locations])
+
+    def random_case(self, rng: random.Random, size: int) -> Dict:
+        keys = rng.sample(self.keys, rng.randint(1, min(size, len(self.keys))))
+        locations = {}
+        for key in keys:
+            f3, f9 = rng.choice(COUNTS)
+            locations[key] = {LK.f3100Count: f3, LK.f9100Count: f9}
+        change = {}
+        for key in rng.sample(self.keys, min(rng.randint(1, 4), len(self.keys))):
+            # deltas go past the caps on purpose, both sides clamp
+            f3, f9 = 0, 0
+            while f3 == 0 and f9 == 0:
+                f3, f9 = rng.randint(-3, 3), rng.randint(-3, 3)
+            change[key] = {LK.f3100Count: f3, LK.f9100Count: f9}
+        return {"solution": {LK.locations: locations}, "change": change}
+
+    def reference(self, case: Dict) -> Result:
+        from original_scoring import calculateScore
+
+        return score_result(
+            calculateScore(
+                self.mapName, applied_solution(case), self.mapEntity, self.generalData
+            )
+        )
+
+    def engines(self) -> Dict[str, Engine]:
+        return {"scoring": self.scoring, "incremental": self.incremental}
+
+    def scoring(self, case: Dict) -> Result:
+        from scoring import calculateScore
+
+        return score_result(
+            calculateScore(
+                self.mapName,
+                case["solution"],
+                case["change"],
+                self.mapEntity,
+                self.generalData,
+                self.distance_cache,
+            )
+        )
+
+    def incremental(self, case: Dict) -> Result:
+        from incremental_scoring import RegularState
+
+        state = RegularState(
+            self.mapEntity, self.generalData, self.distance_cache, case["solution"]
+        )
+        locations = applied_solution(case)[LK.locations]
+        for key in case["change"]:
+            location = locations.get(key)
+            if location is None:
+                state.set_counts(key, 0, 0)
+            else:
+                state.set_counts(key, location[LK.f3100Count], location[LK.f9100Count])
+        return state.total, None
+
+
+class SandboxTarget:
+    def __init__(self, mapName: str, mapEntity: Dict, generalData: Dict) -> None:
+        self.mapName = mapName
+        self.mapEntity = mapEntity
+        self.generalData = generalData
+        self.types = {
+            type[GK.type_]: KW.limits[key]
+            for key, type in generalData[GK.locationTypes].items()
+            if key in KW.limits
+        }
+
+    def random_position(self, rng: random.Random) -> Dict[str, float]:
+        # near a hotspot most of the time, so that footfall is not always zero
+        border = self.mapEntity[MK.border]
+        if self.mapEntity[HK.hotspots] and rng.random() < 0.8:
+            hotspot = rng.choice(self.mapEntity[HK.hotspots])
+            latitude = rng.gauss(hotspot[CK.latitude], 0.001)
+            longitude = rng.gauss(hotspot[CK.longitude], 0.001)
+        else:
+            latitude = rng.uniform(border[MK.latitudeMin], border[MK.latitudeMax])
+            longitude = rng.uniform(border[MK.longitudeMin], border[MK.longitudeMax])
+        return {
+            CK.latitude: min(
+                border[MK.latitudeMax], max(border[MK.latitudeMin], latitude)
+            ),
+            CK.longitude: min(
+                border[MK.longitudeMax], max(border[MK.longitudeMin], longitude)
+            ),
+        }
+
+    def random_location(self, rng: random.Random, type: str) -> Dict:
+        f3, f9 = rng.choice(COUNTS)
+        return {
+            LK.f3100Count: f3,
+            LK.f9100Count: f9,
+            LK.locationType: type,
+            **self.random_position(rng),
+        }
+
+    def random_case(self, rng: random.Random, size: int) -> Dict:
+        used = {type: 0 for type in self.types}
+        locations = {}
+        for i in range(rng.randint(1, min(size, sum(self.types.values())))):
+            type = rng.choice([t for t in self.types if used[t] < self.types[t]])
+            used[type] += 1
+            locations[f"location{i + 1}"] = self.random_location(rng, type)
+        change: Dict[str, Dict] = {}
+        for i in range(rng.randint(1, 3)):
+            kind = rng.choice(["counts", "move", "type", "add"])
+            if kind == "add":
+                key = f"candidate{i + 1}"
+                change[key] = self.random_location(rng, rng.choice(list(self.types)))
+                continue
+            key = rng.choice(list(locations))
+            mod = change.setdefault(key, {})
+            if kind == "counts":
+                # counts are deltas, keep at least one station
+                f3, f9 = rng.choice(COUNTS)
+                location = locations[key]
+                mod[LK.f3100Count] = f3 - location[LK.f3100Count]
+                mod[LK.f9100Count] = f9 - location[LK.f9100Count]
+            elif kind == "move":
+                mod.update(self.random_position(rng))
+            else:
+                # may break the type limits, then both sides should refuse it
+                mod[LK.locationType] = rng.choice(list(self.types))
+        return {"solution": {LK.locations: locations}, "change": change}
+
+    def names(self, case: Dict) -> Tuple[Dict[str, str], Dict[str, str]]:
+        from sandbox_helper import temporary_names
+
+        return temporary_names(case["solution"], case["change"])
+
+    def reference(self, case: Dict) -> Result:
+        from original_scoring import calculateScore
+
+        names, _ = self.names(case)
+        locations = applied_solution(case)[LK.locations]
+        solution = {
+            LK.locations: {names[key]: location for key, location in locations.items()}
+        }
+        return score_result(
+            calculateScore(self.mapName, solution, self.mapEntity, self.generalData)
+        )
+
+    def engines(self) -> Dict[str, Engine]:
+        return {"scoring": self.scoring, "incremental": self.incremental}
+
+    def scoring(self, case: Dict) -> Result:
+        from scoring import calculateScore
+
+        names, inverse = self.names(case)
+        # the fast scorer expects neighbours at the positions after the change
+        locations = applied_solution(case)[LK.locations]
+        return score_result(
+            calculateScore(
+                self.mapName,
+                case["solution"],
+                case["change"],
+                self.mapEntity,
+                self.generalData,
+                build_distance_cache(locations, self.generalData),
+                sandbox_names=names,
+                inverse_sandbox_names=inverse,
+                hotspot_footfall_cache={},
+            )
+        )
+
+    def incremental(self, case: Dict) -> Optional[Result]:
+        from incremental_scoring import SandboxState
+
+        solution = case["solution"][LK.locations]
+        for key, mod in case["change"].items():
+            # the state has no additions or type changes
+            if key not in solution or LK.locationType in mod:
+                return None
+        state = SandboxState(self.mapEntity, self.generalData, case["solution"])
+        locations = applied_solution(case)[LK.locations]
+        for key in case["change"]:
+            location = locations[key]
+            state.set_counts(key, location[LK.f3100Count], location[LK.f9100Count])
+            state.set_position(key, location[CK.latitude], location[CK.longitude])
+        return state.total, None
+
+
+def run_engine(engine: Callable[[Dict], Optional[Result]], case: Dict) -> Dict:
+    # invalid solutions end in SystemExit, that is an answer as well
+    try:
+        result = engine(case)
+    except SystemExit as e:
+        return {"invalid": str(e)}
+    except Exception as e:
+        return {"error": repr(e)}
+    if result is None:
+        return {"skipped": True}
+    total, locations = result
+    return {"total": total, "locations": locations}
+
+
+def compare(expected: Dict, got: Dict, tolerance: float) -> List[str]:
+    if "skipped" in got:
+        return []
+    if "error" in got:
+        return [f"error {got['error']}"]
+    if "invalid" in expected or "invalid" in got:
+        if ("invalid" in expected) != ("invalid" in got):
+            return [
+                f"invalid: expected {expected.get('invalid')}, got {got.get('invalid')}"
+            ]
+        return []
+    found = []
+    if not math.isclose(
+        expected["total"], got["total"], rel_tol=tolerance, abs_tol=tolerance
+    ):
+        found.append(f"total: expected {expected['total']}, got {got['total']}")
+    if got["locations"] is None:
+        return found
+    for key in sorted(set(expected["locations"]) | set(got["locations"])):
+        if key not in got["locations"]:
+            found.append(f"{key}: missing")
+            continue
+        if key not in expected["locations"]:
+            found.append(f"{key}: unexpected")
+            continue
+        want = expected["locations"][key]
+        have = got["locations"][key]
+        for field in sorted(set(want) & set(have)):
+            a, b = want[field], have[field]
+            if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+                same = math.isclose(a, b, rel_tol=tolerance, abs_tol=tolerance)
+            else:
+                same = a == b
+            if not same:
+                found.append(f"{key}.{field}: expected {a}, got {b}")
+    return found
+
+
+def shrink(case: Dict, fails: Callable[[Dict], bool]) -> Dict:
+    # drop chunks of locations and change entries while the case still fails
+    def without(case: Dict, part: str, keys: List[str]) -> Dict:
+        smaller = copy.deepcopy(case)
+        if part == "solution":
+            smaller["solution"][LK.locations] = {
+                key: case["solution"][LK.locations][key] for key in keys
+            }
+        else:
+            smaller["change"] = {key: case["change"][key] for key in keys}
+        return smaller
+
+    for part in ["change", "solution"]:
+        if part == "solution":
+            # locations that the change refers to have to stay
+            fixed = [k for k in case["solution"][LK.locations] if k in case["change"]]
+            keys = [k for k in case["solution"][LK.locations] if k not in fixed]
+        else:
+            fixed = []
+            keys = list(case["change"])
+        chunk = max(1, len(keys) // 2)
+        while keys:
+            i = 0
+            while i < len(keys):
+                candidate = keys[:i] + keys[i + chunk :]
+                smaller = without(case, part, fixed + candidate)
+                if (part == "solution" and not fixed + candidate) or not fails(smaller):
+                    i += chunk
+                else:
+                    case = smaller
+                    keys = candidate
+            if chunk == 1:
+                break
+            chunk //= 2
+    return case
+
+
+class Fuzzer:
+    def __init__(self, target, source: Dict, tolerance: float) -> None:
+        self.target = target
+        self.source = source
+        self.tolerance = tolerance
+        self.engines = target.engines()
+        self.calls: Dict[str, int] = {"reference": 0}
+        self.seconds: Dict[str, float] = {"reference": 0.0}
+        for name in self.engines:
+            self.calls[name] = 0
+            self.seconds[name] = 0.0
+        self.cases = 0
+        self.invalid = 0
+        self.failures: List[Dict] = []
+
+    def timed(self, name: str, engine: Engine, case: Dict) -> Dict:
+        start = time.perf_counter()
+        result = run_engine(engine, case)
+        if "skipped" not in result:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+        return result
+
+    def check(self, name: str, case: Dict) -> List[str]:
+        expected = run_engine(self.target.reference, case)
+        return compare(expected, run_engine(self.engines[name], case), self.tolerance)
+
+    def run_case(self, case: Dict) -> None:
+        self.cases += 1
+        expected = self.timed("reference", self.target.reference, case)
+        if "invalid" in expected:
+            self.invalid += 1
+        for name, engine in self.engines.items():
+            found = compare(expected, self.timed(name, engine, case), self.tolerance)
+            if not found:
+                continue
+            minimal = shrink(case, lambda c: bool(self.check(name, c)))
+            self.failures.append(
+                {
+                    "source": self.source,
+                    "mapName": self.target.mapName,
+                    "engine": name,
+                    "solution": minimal["solution"],
+                    "change": minimal["change"],
+                    "discrepancies": self.check(name, minimal),
+                }
+            )
+            print(f"{self.target.mapName} {name}: {found[0]}", file=sys.stderr)
+
+    def run(self, seed: int, cases: int, size: int, seconds: float) -> None:
+        rng = random.Random(seed)
+        start = time.perf_counter()
+        for _ in range(cases):
+            if seconds and time.perf_counter() - start > seconds:
+                break
+            self.run_case(self.target.random_case(rng, size))
+
+    def report(self) -> Dict:
+        return {
+            "mapName": self.target.mapName,
+            "source": self.source,
+            "cases": self.cases,
+            "invalid": self.invalid,
+            "failures": len(self.failures),
+            "throughput": {
+                name: {
+                    "calls": self.calls[name],
+                    "per_second": (
+                        self.calls[name] / self.seconds[name]
+                        if self.seconds[name] > 0
+                        else None
+                    ),
+                }
+                for name in self.calls
+            },
+        }
+
+
+def make_target(source: Dict):
+    # a cached map by name, or a seeded synthetic one
+    from synthetic import generate_regular, generate_sandbox, load_general
+
+    if source.get("synthetic"):
+        generalData = load_general()
+        if source["sandbox"]:
+            mapEntity = generate_sandbox(source["size"], source["seed"])
+            return SandboxTarget(mapEntity["mapName"], mapEntity, generalData)
+        mapEntity = generate_regular(generalData, source["size"], source["seed"])
+        distance_cache = build_distance_cache(mapEntity[LK.locations], generalData)
+        return RegularTarget(
+            mapEntity["mapName"], mapEntity, generalData, distance_cache
+        )
+
+    from cli import load_data
+    from map_bundle import distance_cache as map_distance_cache
+
+    mapName = source["mapName"]
+    mapEntity, generalData = load_data(mapName)
+    if mapName in [MN.gSandbox, MN.sSandbox]:
+        return SandboxTarget(mapName, mapEntity, generalData)
+    return RegularTarget(
+        mapName,
+        mapEntity,
+        generalData,
+        map_distance_cache(mapName, mapEntity, generalData),
+    )
+
+
+def save_failures(failures: List[Dict], folder: str) -> List[str]:
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for failure in failures:
+        path = f"{folder}/{failure['mapName']}-{failure['engine']}-{len(os.listdir(folder))}.json"
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(failure, f, indent=4)
+        paths.append(path)
+    return paths
+
+
+def replay(path: str, tolerance: float) -> List[str]:
+    with open(path, "r", encoding="utf8") as f:
+        failure = json.load(f)
+    target = make_target(failure["source"])
+    case = {"solution": failure["solution"], "change": failure["change"]}
+    return compare(
+        run_engine(target.reference, case),
+        run_engine(target.engines()[failure["engine"]], case),
+        tolerance,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare the scoring engines against original_scoring"
+    )
+    parser.add_argument("maps", nargs="*", help="cached maps, synthetic by default")
+    parser.add_argument("--cases", type=int, default=Settings.fuzz_cases)
+    parser.add_argument("--seconds", type=float, default=0.0, help="per map")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", type=int, default=400, help="synthetic map size")
+    parser.add_argument("--locations", type=int, default=50, help="per solution")
+    parser.add_argument("--tolerance", type=float, default=Settings.fuzz_tolerance)
+    parser.add_argument("--output", default=Settings.fuzz_folder)
+    parser.add_argument("--replay", help="run a saved reproducer again")
+    args = parser.parse_args(argv)
+
+    # the code under test prints progress, keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.replay:
+            found = replay(args.replay, args.tolerance)
+            for line in found:
+                print(line, file=sys.stderr)
+            return 1 if found else 0
+        if args.maps:
+            sources = [{"mapName": mapName} for mapName in args.maps]
+        else:
+            sources = [
+                {"synthetic": True, "sandbox": sandbox, "size": args.size}
+                for sandbox in [False, True]
+            ]
+            for source in sources:
+                source["seed"] = args.seed
+        reports = []
+        failures = []
+        for source in sources:
+            fuzzer = Fuzzer(make_target(source), source, args.tolerance)
+            fuzzer.run(args.seed, args.cases, args.locations, args.seconds)
+            reports.append(fuzzer.report())
+            failures += fuzzer.failures
+        paths = save_failures(failures, args.output) if failures else []
+    print(json.dumps({"maps": reports, "reproducers": paths}, indent=4))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import functools
 import math
 from typing import Any, Dict, Optional
 
@@ -6,6 +7,8 @@ from data_keys import (
     CoordinateKeys as CK,
     GeneralKeys as GK,
     LocationKeys as LK,
+    MapNames as MN,
+    ScoringKeys as SK,
 )
 
 from settings import Settings
@@ -41,7 +44,7 @@ def apply_change(
 ) -> None:
     for key, mod in change.items():
         if key not in locations:
-            locations[key] = mod
+            locations[key] = dict(mod)  # mods may be shared, see count_bundle
         else:
             for mkey, mval in mod.items():
                 if mkey in [LK.f3100Count, LK.f9100Count]:
@@ -88,6 +91,13 @@ def bundle(
     return out
 
 
+@functools.lru_cache(maxsize=None)
+def count_bundle(f3: int, f9: int) -> Dict[str, Any]:
+    # one shared mod per count change instead of a new dict per suggestion,
+    # never modify the result
+    return bundle(f3, f9)
+
+
 def build_distance_cache(
     locations: Dict[str, Dict], generalData: Dict
 ) -> Dict[str, Dict]:
@@ -114,3 +124,23 @@ def build_distance_cache(
             else:
                 way_too_far = min(way_too_far, 10.0 * abc)
     return distance_cache
+
+
+def get_solution(game: Dict) -> Dict[str, Dict]:
+    locations = {}
+    mapName = game[SK.mapName]
+
+    for k, v in game[LK.locations].items():
+        if mapName not in [MN.gSandbox, MN.sSandbox]:
+            if v[LK.f3100Count] == 0 and v[LK.f9100Count] == 0:
+                continue
+        locations[k] = {
+            LK.f3100Count: v[LK.f3100Count],
+            LK.f9100Count: v[LK.f9100Count],
+        }
+        if mapName in [MN.gSandbox, MN.sSandbox]:
+            locations[k][LK.locationType] = v[LK.locationType]
+            locations[k][CK.latitude] = v[CK.latitude]
+            locations[k][CK.longitude] = v[CK.longitude]
+
+    return {LK.locations: locations}
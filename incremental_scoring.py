@@ -0,0 +1,322 @@
+import math
+from typing import Dict, Iterable, Set, Tuple
+
+from data_keys import (
+    CoordinateKeys as CK,
+    GeneralKeys as GK,
+    HotspotKeys as HK,
+    LocationKeys as LK,
+)
+from original_scoring import distanceBetweenPoint
+from settings import Settings
+
+
+class ScoreConstants:
+    def __init__(self, generalData: Dict) -> None:
+        self.cap3 = generalData[GK.f3100Data][GK.refillCapacityPerWeek]
+        self.cap9 = generalData[GK.f9100Data][GK.refillCapacityPerWeek]
+        self.lease3 = generalData[GK.f3100Data][GK.leasingCostPerWeek]
+        self.lease9 = generalData[GK.f9100Data][GK.leasingCostPerWeek]
+        self.static3 = generalData[GK.f3100Data][GK.staticCo2]
+        self.static9 = generalData[GK.f9100Data][GK.staticCo2]
+        self.profit = generalData[GK.refillUnitData][GK.profitPerUnit]
+        self.co2_per_sale = (
+            generalData[GK.classicUnitData][GK.co2PerUnitInGrams]
+            - generalData[GK.refillUnitData][GK.co2PerUnitInGrams]
+        )
+        self.co2_price = generalData[GK.co2PricePerKiloInSek]
+
+    def value(self, sales_volume: float, f3: int, f9: int, zero_sales: bool) -> float:
+        # the per location part of (co2Savings * co2Price + earnings)
+        sales = sales_volume
+        if zero_sales:
+            sales = 0
+        capacity = f3 * self.cap3 + f9 * self.cap9
+        if capacity < sales_volume:
+            sales = capacity
+        revenue = sales * self.profit
+        leasing = f3 * self.lease3 + f9 * self.lease9
+        co2 = sales * self.co2_per_sale - f3 * self.static3 - f9 * self.static9
+        return co2 / 1000 * self.co2_price + (revenue - leasing) / 1000
+
+
+class RegularState:
+    def __init__(
+        self,
+        mapEntity: Dict,
+        generalData: Dict,
+        distance_cache: Dict[str, Dict],
+        solution: Dict[str, Dict],
+    ) -> None:
+        self.constants = ScoreConstants(generalData)
+        self.distance_cache = distance_cache
+        self.distribution_rate = generalData[GK.refillDistributionRate]
+        sales_factor = generalData[GK.refillSalesFactor]
+        exp_base = generalData[GK.constantExpDistributionFunction]
+        willingness = generalData[GK.willingnessToTravelInMeters]
+
+        self.base_sales: Dict[str, float] = {}
+        self.footfall: Dict[str, float] = {}
+        self.weights: Dict[str, Dict[str, float]] = {}
+        for key, location in mapEntity[LK.locations].items():
+            self.base_sales[key] = location[LK.salesVolume] * sales_factor
+            self.footfall[key] = location[LK.footfall]
+            self.weights[key] = {
+                nkey: math.pow(exp_base, willingness - distance) - 1
+                for nkey, distance in distance_cache[key].items()
+            }
+
+        self.counts: Dict[str, Tuple[int, int]] = {}
+        for key, location in solution[LK.locations].items():
+            f3 = min(Settings.max_stations, max(0, location[LK.f3100Count]))
+            f9 = min(Settings.max_stations, max(0, location[LK.f9100Count]))
+            if f3 > 0 or f9 > 0:
+                self.counts[key] = (f3, f9)
+
+        self.values: Dict[str, float] = {}
+        self.footfalls: Dict[str, float] = {}
+        self.value_sum = 0.0
+        self.footfall_sum = 0.0
+        self.resync()
+
+    @property
+    def total(self) -> float:
+        return self.value_sum * (1 + self.footfall_sum)
+
+    def resync(self) -> None:
+        self.values = {}
+        self.footfalls = {}
+        for key in self.counts:
+            self.values[key], self.footfalls[key] = self.evaluate(key)
+        self.value_sum = sum(self.values.values())
+        self.footfall_sum = sum(self.footfalls.values())
+
+    def evaluate(self, key: str) -> Tuple[float, float]:
+        # mirrors distributeSales and divideFootfall in scoring for a single location
+        counts = self.counts
+        sales = self.base_sales[key]
+        active_nearby = 0
+        for nkey in self.distance_cache[key]:
+            if nkey in counts:
+                active_nearby += 1
+                continue
+            weights = self.weights[nkey]
+            total = 0
+            for wkey, weight in weights.items():
+                if wkey in counts:
+                    total += weight
+            sales += (
+                weights[key] / total * self.distribution_rate * self.base_sales[nkey]
+            )
+        f3, f9 = counts[key]
+        value = self.constants.value(round(sales, 0), f3, f9, False)
+        footfall = self.footfall[key] / (1 + active_nearby) / 1000
+        return value, footfall
+
+    def affected(self, key: str) -> Set[str]:
+        affected = {key}
+        for nkey in self.distance_cache[key]:
+            affected.add(nkey)
+            if nkey not in self.counts:
+                affected.update(self.distance_cache[nkey])
+        return affected
+
+    def get_counts(self, key: str) -> Tuple[int, int]:
+        return self.counts.get(key, (0, 0))
+
+    def set_counts(self, key: str, f3: int, f9: int) -> Tuple[int, int]:
+        # returns the previous counts so that the change can be undone
+        old = self.counts.get(key, (0, 0))
+        was_active = key in self.counts
+        is_active = f3 > 0 or f9 > 0
+        if was_active and is_active:
+            self.counts[key] = (f3, f9)
+            self.replace(key)
+            return old
+        affected = self.affected(key)
+        self.remove(affected)
+        if is_active:
+            self.counts[key] = (f3, f9)
+        elif was_active:
+            del self.counts[key]
+        self.add(akey for akey in affected if akey in self.counts)
+        return old
+
+    def replace(self, key: str) -> None:
+        value, footfall = self.evaluate(key)
+        self.value_sum += value - self.values[key]
+        self.footfall_sum += footfall - self.footfalls[key]
+        self.values[key] = value
+        self.footfalls[key] = footfall
+
+    def remove(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            if key in self.values:
+                self.value_sum -= self.values.pop(key)
+                self.footfall_sum -= self.footfalls.pop(key)
+
+    def add(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            value, footfall = self.evaluate(key)
+            self.values[key] = value
+            self.footfalls[key] = footfall
+            self.value_sum += value
+            self.footfall_sum += footfall
+
+    def solution(self) -> Dict[str, Dict]:
+        return {
+            LK.locations: {
+                key: {LK.f3100Count: f3, LK.f9100Count: f9}
+                for key, (f3, f9) in self.counts.items()
+            }
+        }
+
+
+class SandboxState:
+    def __init__(
+        self, mapEntity: Dict, generalData: Dict, solution: Dict[str, Dict]
+    ) -> None:
+        self.constants = ScoreConstants(generalData)
+        self.hotspots = mapEntity[HK.hotspots]
+        self.willingness = generalData[GK.willingnessToTravelInMeters]
+        self.sales_volumes = {
+            type[GK.type_]: type[GK.salesVol]
+            for type in generalData[GK.locationTypes].values()
+        }
+
+        self.locations: Dict[str, Dict] = {
+            key: {
+                LK.locationType: location[LK.locationType],
+                LK.f3100Count: location[LK.f3100Count],
+                LK.f9100Count: location[LK.f9100Count],
+                CK.latitude: location[CK.latitude],
+                CK.longitude: location[CK.longitude],
+            }
+            for key, location in solution[LK.locations].items()
+        }
+        self.hotspot_footfall: Dict[str, float] = {}
+        self.neighbours: Dict[str, Dict[str, float]] = {}
+        for key in self.locations:
+            self.hotspot_footfall[key] = self.calculate_footfall(key)
+            self.neighbours[key] = {}
+        keys = list(self.locations)
+        for i, key in enumerate(keys):
+            for nkey in keys[i + 1 :]:
+                distance = self.distance(key, nkey)
+                if distance < self.willingness:
+                    self.neighbours[key][nkey] = distance
+                    self.neighbours[nkey][key] = distance
+
+        self.values: Dict[str, float] = {}
+        self.footfalls: Dict[str, float] = {}
+        self.value_sum = 0.0
+        self.footfall_sum = 0.0
+        self.resync()
+
+    @property
+    def total(self) -> float:
+        return self.value_sum * (1 + self.footfall_sum)
+
+    def resync(self) -> None:
+        self.values = {}
+        self.footfalls = {}
+        for key in self.locations:
+            self.values[key], self.footfalls[key] = self.evaluate(key)
+        self.value_sum = sum(self.values.values())
+        self.footfall_sum = sum(self.footfalls.values())
+
+    def distance(self, key: str, nkey: str) -> float:
+        location = self.locations[key]
+        other = self.locations[nkey]
+        return distanceBetweenPoint(
+            location[CK.latitude],
+            location[CK.longitude],
+            other[CK.latitude],
+            other[CK.longitude],
+        )
+
+    def calculate_footfall(self, key: str) -> float:
+        # same accumulation order as calculateFootfall in original_scoring
+        location = self.locations[key]
+        footfall = 0
+        for hotspot in self.hotspots:
+            distance = distanceBetweenPoint(
+                hotspot[CK.latitude],
+                hotspot[CK.longitude],
+                location[CK.latitude],
+                location[CK.longitude],
+            )
+            spread = hotspot[HK.spread]
+            if distance <= spread:
+                footfall += hotspot[LK.footfall] * (1 - (distance / spread)) / 10
+        return footfall
+
+    def evaluate(self, key: str) -> Tuple[float, float]:
+        location = self.locations[key]
+        count = 1 + len(self.neighbours[key])
+        sales_volume = self.sales_volumes[location[LK.locationType]] / count
+        footfall = self.hotspot_footfall[key] / count
+        value = self.constants.value(
+            round(sales_volume, 0),
+            location[LK.f3100Count],
+            location[LK.f9100Count],
+            footfall <= 0,
+        )
+        return value, footfall / 1000
+
+    def reevaluate(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            value, footfall = self.evaluate(key)
+            self.value_sum += value - self.values[key]
+            self.footfall_sum += footfall - self.footfalls[key]
+            self.values[key] = value
+            self.footfalls[key] = footfall
+
+    def get_counts(self, key: str) -> Tuple[int, int]:
+        location = self.locations[key]
+        return location[LK.f3100Count], location[LK.f9100Count]
+
+    def set_counts(self, key: str, f3: int, f9: int) -> Tuple[int, int]:
+        old = self.get_counts(key)
+        self.locations[key][LK.f3100Count] = f3
+        self.locations[key][LK.f9100Count] = f9
+        self.reevaluate([key])
+        return old
+
+    def get_position(self, key: str) -> Tuple[float, float]:
+        location = self.locations[key]
+        return location[CK.latitude], location[CK.longitude]
+
+    def set_position(
+        self, key: str, latitude: float, longitude: float
+    ) -> Tuple[float, float]:
+        old = self.get_position(key)
+        self.locations[key][CK.latitude] = latitude
+        self.locations[key][CK.longitude] = longitude
+        self.hotspot_footfall[key] = self.calculate_footfall(key)
+
+        affected = {key}
+        for nkey in self.neighbours[key]:
+            del self.neighbours[nkey][key]
+            affected.add(nkey)
+        self.neighbours[key] = {}
+        for nkey in self.locations:
+            if nkey == key:
+                continue
+            distance = self.distance(key, nkey)
+            if distance < self.willingness:
+                self.neighbours[key][nkey] = distance
+                self.neighbours[nkey][key] = distance
+                affected.add(nkey)
+        self.reevaluate(affected)
+        return old
+
+    def distance_cache(self) -> Dict[str, Dict]:
+        return {key: dict(nearby) for key, nearby in self.neighbours.items()}
+
+    def solution(self) -> Dict[str, Dict]:
+        return {
+            LK.locations: {
+                key: dict(location) for key, location in self.locations.items()
+            }
+        }
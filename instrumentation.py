@@ -0,0 +1,176 @@
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterable, List, Optional
+
+from settings import Settings
+from suggestion import ScoredSuggestion, Suggestion
+
+try:
+    import resource
+except ImportError:  # not on windows
+    resource = None  # type: ignore
+
+FIELDS = ["generated", "pruned", "scored", "improving"]
+TIMES = ["generate_wall", "generate_cpu", "score_wall", "score_cpu"]
+MEMORY = ["memory_growth"]
+
+
+def peak_rss() -> Optional[int]:
+    # bytes, ru_maxrss is in kilobytes on linux
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def site_statistics(statistics: List, top: int) -> List[Dict]:
+    sites = []
+    for statistic in statistics[:top]:
+        frame = statistic.traceback[0]
+        site = {"site": f"{frame.filename}:{frame.lineno}"}
+        site["size"] = statistic.size
+        site["count"] = statistic.count
+        if hasattr(statistic, "size_diff"):
+            site["size_diff"] = statistic.size_diff
+            site["count_diff"] = statistic.count_diff
+        sites.append(site)
+    return sites
+
+
+class Instrumentation:
+    # per action counts and timings of Solver.find_scored_suggestions, one
+    # json line per iteration
+    def __init__(self, mapName: str, path: str = "") -> None:
+        self.mapName = mapName
+        self.path = path or f"{Settings.log_folder}/{mapName}.actions.jsonl"
+        self.iteration = 0
+        self.start = time.perf_counter()
+        self.actions: List[Dict] = []
+        self.totals: Dict[str, Dict[str, float]] = {}
+        # allocation tracking is slow, it is only on with instrument_memory
+        self.memory = Settings.instrument_memory
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(Settings.memory_frames)
+
+    def run(
+        self,
+        action: Callable[[List[ScoredSuggestion]], Iterable[Suggestion]],
+        scored_suggestions: List[ScoredSuggestion],
+        score: Callable[[Iterable[Suggestion]], List[ScoredSuggestion]],
+    ) -> List[ScoredSuggestion]:
+        if self.memory:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+        # generators are drained first so that generating and scoring are
+        # timed separately
+        wall, cpu = time.perf_counter(), time.process_time()
+        generated = list(action(scored_suggestions))
+        generate_wall = time.perf_counter() - wall
+        generate_cpu = time.process_time() - cpu
+
+        suggestions = [suggestion for suggestion in generated if suggestion.change]
+        wall, cpu = time.perf_counter(), time.process_time()
+        output = score(suggestions)
+        score_wall = time.perf_counter() - wall
+        score_cpu = time.process_time() - cpu
+
+        record = {
+            "action": action.__name__,
+            "generated": len(generated),
+            "pruned": len(generated) - len(suggestions),
+            "scored": len(suggestions),
+            # the output repeats a suggestion for every key it changes
+            "improving": len({id(suggestion) for suggestion in output}),
+            "generate_wall": generate_wall,
+            "generate_cpu": generate_cpu,
+            "score_wall": score_wall,
+            "score_cpu": score_cpu,
+            "per_second": len(suggestions) / score_wall if score_wall > 0 else None,
+        }
+        if self.memory:
+            # what the action leaves behind, the output is still referenced
+            after, peak = tracemalloc.get_traced_memory()
+            record["memory_growth"] = after - before
+            record["memory_peak"] = peak - before
+        self.actions.append(record)
+        fields = FIELDS + TIMES + (MEMORY if self.memory else [])
+        totals = self.totals.setdefault(
+            record["action"], {field: 0 for field in fields}
+        )
+        for field in fields:
+            totals[field] += record[field]
+        return output
+
+    def take_snapshot(self) -> Dict:
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ]
+        )
+        current, peak = tracemalloc.get_traced_memory()
+        memory = {
+            "current": current,
+            "peak": peak,
+            "top": site_statistics(snapshot.statistics("lineno"), Settings.memory_top),
+        }
+        if self.snapshot is not None:
+            memory["growth"] = site_statistics(
+                snapshot.compare_to(self.snapshot, "lineno"), Settings.memory_top
+            )
+        self.snapshot = snapshot
+        return memory
+
+    def end_iteration(self, best: float) -> None:
+        self.iteration += 1
+        line = {
+            "mapName": self.mapName,
+            "iteration": self.iteration,
+            "elapsed": time.perf_counter() - self.start,
+            "best": best,
+            "peak_rss": peak_rss(),
+            "actions": self.actions,
+        }
+        # the first iteration and then every memory_interval
+        if self.memory and (self.iteration - 1) % Settings.memory_interval == 0:
+            line["memory"] = self.take_snapshot()
+        self.actions = []
+        # opened per line, the solver may be pickled for a process pool
+        with open(self.path, "a", encoding="utf8") as f:
+            f.write(json.dumps(line) + "\n")
+
+    def summary(self) -> str:
+        lines = [
+            f"{'action':<26}{'generated':>11}{'pruned':>8}{'scored':>10}"
+            f"{'improving':>10}{'gen s':>9}{'score s':>9}{'cpu s':>9}{'per s':>10}"
+            + (f"{'growth MB':>11}" if self.memory else "")
+        ]
+        for name, totals in self.totals.items():
+            wall = totals["score_wall"]
+            per_second = totals["scored"] / wall if wall > 0 else 0.0
+            cpu = totals["generate_cpu"] + totals["score_cpu"]
+            line = (
+                f"{name:<26}{totals['generated']:>11}{totals['pruned']:>8}"
+                f"{totals['scored']:>10}{totals['improving']:>10}"
+                f"{totals['generate_wall']:>9.2f}{wall:>9.2f}{cpu:>9.2f}"
+                f"{per_second:>10.0f}"
+            )
+            if self.memory:
+                line += f"{totals['memory_growth'] / 2**20:>11.1f}"
+            lines.append(line)
+        rss = peak_rss()
+        if rss is not None:
+            lines.append(f"peak rss {rss / 2**20:.0f} MB")
+        if self.memory:
+            for site in self.take_snapshot()["top"]:
+                lines.append(
+                    f"{site['size'] / 2**20:>9.1f} MB {site['count']:>9} "
+                    f"blocks  {site['site']}"
+                )
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        print(self.summary(), file=sys.stderr)
@@ -1,12 +1,14 @@
 import os
 import random
 import sys
+import time
 from typing import Dict
 from data_keys import (
     MapNames as MN,
     MapKeys as MK,
     LocationKeys as LK,
     CoordinateKeys as CK,
+    ScoringKeys as SK,
 )
 from dotenv import load_dotenv
 from api import getGeneralData, getMapData
@@ -18,10 +20,11 @@ from best import best
 from store import store
 from submit import get_solution, load_game
 from suggestion import get_total
+from undo_log import UndoLog
 
 
 load_dotenv()
-apiKey = os.environ["apiKey"]
+apiKey = os.environ.get("apiKey", "")
 
 
 def jiggle_sandbox(
@@ -30,43 +33,52 @@ def jiggle_sandbox(
     mapEntity: Dict,
     generalData: Dict,
     mapLimiter: MapLimiter,
+    log: UndoLog,
 ) -> Dict:
     max_step_factor = 0.001
     step_lat = mapLimiter.latitudeDiff * max_step_factor * 2 * (random.random() - 0.5)
     step_long = mapLimiter.longitudeDiff * max_step_factor * 2 * (random.random() - 0.5)
     location = random.choice(list(solution[LK.locations].values()))
-    location[CK.latitude] = mapLimiter.latitude(location[CK.latitude] + step_lat)
-    location[CK.longitude] = mapLimiter.longitude(location[CK.longitude] + step_long)
+    log.set(
+        location,
+        CK.latitude,
+        mapLimiter.latitude(location[CK.latitude] + step_lat),
+    )
+    log.set(
+        location,
+        CK.longitude,
+        mapLimiter.longitude(location[CK.longitude] + step_long),
+    )
     return calculateScore(mapName, solution, mapEntity, generalData, round_total=True)
 
 
-def increase(location):
+def increase(location, log: UndoLog):
     if location[LK.f3100Count] < Settings.max_stations:
-        location[LK.f3100Count] += 1
+        log.set(location, LK.f3100Count, location[LK.f3100Count] + 1)
     elif location[LK.f9100Count] < Settings.max_stations:
-        location[LK.f3100Count] = 0
-        location[LK.f9100Count] += 1
+        log.set(location, LK.f3100Count, 0)
+        log.set(location, LK.f9100Count, location[LK.f9100Count] + 1)
 
 
-def decrease(location):
+def decrease(location, log: UndoLog):
     if location[LK.f3100Count] > 0:
-        location[LK.f3100Count] -= 1
+        log.set(location, LK.f3100Count, location[LK.f3100Count] - 1)
     elif location[LK.f9100Count] > 0:
-        location[LK.f9100Count] -= 1
-        location[LK.f3100Count] = 2
+        log.set(location, LK.f9100Count, location[LK.f9100Count] - 1)
+        log.set(location, LK.f3100Count, 2)
 
 
 def jiggle_regular(
-    mapName: str, solution: Dict, mapEntity: Dict, generalData: Dict
+    mapName: str, solution: Dict, mapEntity: Dict, generalData: Dict, log: UndoLog
 ) -> Dict:
     key = random.choice(list(solution[LK.locations].keys()))
     location = solution[LK.locations][key]
     if random.random() > 0.4:
-        increase(location)
+        increase(location, log)
     else:
-        decrease(location)
+        decrease(location, log)
         if location[LK.f3100Count] == location[LK.f9100Count] == 0:
-            del solution[LK.locations][key]
+            log.delete(solution[LK.locations], key)
     return calculateScore(mapName, solution, mapEntity, generalData, round_total=True)
 
 
@@ -85,30 +97,38 @@ def jiggle(mapName: str) -> None:
 
     total, id = best(mapName)
     print(f"{total}\t\t{id}")
+    solution = get_solution(load_game(id))
+    # mutations since the best solution, rolled back instead of reloading the game
+    log = UndoLog()
+    last_sync = time.perf_counter()
 
     while True:
-        total, id = best(mapName)
-        game = load_game(id)
-        solution = get_solution(game)
-
-        while True:
-            if mapName in [MN.gSandbox, MN.sSandbox]:
-                score = jiggle_sandbox(
-                    mapName, solution, mapEntity, generalData, mapLimiter
-                )
-            else:
-                score = jiggle_regular(mapName, solution, mapEntity, generalData)
-
-            new_total = get_total(score)
-            if new_total > total:
-                print("")
-                store(mapName, score)
-                total = new_total
-            elif abs(new_total - total) < 16.0:
-                print("+", end="", flush=True)
-            else:
-                print("_", end="", flush=True)
-                break
+        if mapName in [MN.gSandbox, MN.sSandbox]:
+            score = jiggle_sandbox(
+                mapName, solution, mapEntity, generalData, mapLimiter, log
+            )
+        else:
+            score = jiggle_regular(mapName, solution, mapEntity, generalData, log)
+
+        new_total = get_total(score)
+        if new_total > total:
+            print("")
+            store(mapName, score)
+            total = new_total
+            id = score[SK.gameId]
+            log.commit()
+        elif abs(new_total - total) < 16.0:
+            print("+", end="", flush=True)
+        else:
+            print("_", end="", flush=True)
+            log.rollback()
+            if time.perf_counter() - last_sync > Settings.jiggle_sync_interval:
+                # pick up improvements from other processes now and then
+                last_sync = time.perf_counter()
+                best_total, best_id = best(mapName)
+                if best_total > total:
+                    total, id = best_total, best_id
+                    solution = get_solution(load_game(id))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,31 @@
+from typing import Dict, Iterable, List
+
+
+class KeyTable:
+    # dense integer ids for location keys, the solver masks are indexed by
+    # them. scoring, the caches and suggestion changes keep string keys
+    def __init__(self, keys: Iterable[str] = ()) -> None:
+        self.ids: Dict[str, int] = {}
+        self.keys: List[str] = []
+        for key in keys:
+            self.intern(key)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.ids
+
+    def intern(self, key: str) -> int:
+        id = self.ids.get(key)
+        if id is None:
+            id = len(self.keys)
+            self.ids[key] = id
+            self.keys.append(key)
+        return id
+
+    def id(self, key: str) -> int:
+        return self.ids[key]
+
+    def key(self, id: int) -> str:
+        return self.keys[id]
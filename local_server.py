@@ -0,0 +1,149 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from data_keys import ScoringKeys as SK
+from original_scoring import calculateScore
+from settings import Settings
+
+
+class LocalGame:
+    # stand-in for the game endpoints, scored with original_scoring
+    def __init__(
+        self, data_folder: str, latency: float, jitter: float, failure_rate: float
+    ) -> None:
+        self.data_folder = data_folder
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.maps: Dict[str, Dict] = {}
+        self.games: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def load(self, name: str) -> Optional[Dict]:
+        with self.lock:
+            if name not in self.maps:
+                try:
+                    with open(f"{self.data_folder}/{name}.json", encoding="utf8") as f:
+                        self.maps[name] = json.load(f)
+                except FileNotFoundError:
+                    return None
+            return self.maps[name]
+
+    def delay(self) -> None:
+        with self.lock:
+            self.requests += 1
+        wait = self.latency + random.uniform(0, self.jitter)
+        if wait > 0:
+            time.sleep(wait)
+
+    def should_fail(self) -> bool:
+        return random.random() < self.failure_rate
+
+    def submit(self, mapName: str, solution: Dict) -> Dict:
+        mapEntity = self.load(mapName)
+        generalData = self.load("general")
+        if mapEntity is None or generalData is None:
+            raise ValueError(f"No data for {mapName}")
+        try:
+            score = calculateScore(
+                mapName, solution, mapEntity, generalData, round_total=True
+            )
+        except SystemExit as e:
+            # the scorer reports invalid solutions by exiting
+            raise ValueError(str(e))
+        with self.lock:
+            self.games[score[SK.gameId]] = score
+        return score
+
+
+def make_handler(game: LocalGame):
+    class Handler(BaseHTTPRequestHandler):
+        def reply(self, status: int, body) -> None:
+            data = json.dumps(body).encode("utf8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def route(self) -> None:
+            game.delay()
+            if game.should_fail():
+                self.reply(503, {"error": "injected failure"})
+                return
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            endpoint = url.path.rsplit("/", 1)[-1]
+            if self.command == "GET" and endpoint == "getMapData":
+                data = game.load(query.get("mapName", ""))
+            elif self.command == "GET" and endpoint == "getGeneralGameData":
+                data = game.load("general")
+            elif self.command == "GET" and endpoint == "getGameData":
+                data = game.games.get(query.get("gameId", ""))
+            elif self.command == "POST" and endpoint == "submitSolution":
+                if not self.headers.get("x-api-key"):
+                    self.reply(401, {"error": "missing x-api-key"})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    solution = json.loads(self.rfile.read(length))
+                    data = game.submit(query.get("mapName", ""), solution)
+                except ValueError as e:
+                    self.reply(400, {"error": str(e)})
+                    return
+            else:
+                self.reply(404, {"error": f"unknown endpoint {url.path}"})
+                return
+            if data is None:
+                self.reply(404, {"error": "not found"})
+            else:
+                self.reply(200, data)
+
+        def do_GET(self) -> None:
+            self.route()
+
+        def do_POST(self) -> None:
+            self.route()
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    return Handler
+
+
+def serve(
+    port: int,
+    data_folder: str,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    failure_rate: float = 0.0,
+) -> ThreadingHTTPServer:
+    game = LocalGame(data_folder, latency, jitter, failure_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(game))
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Offline stand-in for the game endpoints, set domain=http://127.0.0.1:<port> to use it"
+    )
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--data", default=Settings.cache_folder)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = serve(args.port, args.data, args.latency, args.jitter, args.failure_rate)
+    print(f"serving {args.data} on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
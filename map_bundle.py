@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from data_keys import (
+    CoordinateKeys as CK,
+    HotspotKeys as HK,
+    LocationKeys as LK,
+    MapKeys as MK,
+    MapNames as MN,
+)
+from helper import build_distance_cache, bundle
+from map_limiter import MapLimiter
+from sandbox_helper import build_hotspot_cache, find_possible_locations
+from settings import Settings, KW
+
+BUNDLE_VERSION = 1
+
+
+def bundle_folder(mapName: str) -> str:
+    return f"{Settings.cache_folder}/{mapName}.bundle"
+
+
+def bundle_hash(mapName: str, mapEntity: Dict, generalData: Dict) -> str:
+    # everything the derived structures depend on, the map as passed in so
+    # that maps held in memory get bundles of their own. the hotspot cache
+    # adds the neighbours to the hotspots, they are left out
+    entity = dict(mapEntity)
+    if HK.hotspots in entity:
+        entity[HK.hotspots] = [
+            {key: value for key, value in hotspot.items() if key != KW.nearby}
+            for hotspot in entity[HK.hotspots]
+        ]
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps([mapName, entity, generalData], sort_keys=True).encode("utf8")
+    )
+    digest.update(f"{BUNDLE_VERSION} {Settings.granularity}".encode("utf8"))
+    return digest.hexdigest()
+
+
+def to_csr(
+    keys: List[str], nearby: Dict[str, Dict[str, float]]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # neighbour order is kept, scoring sums in distance cache order
+    index = {key: i for i, key in enumerate(keys)}
+    indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+    indices: List[int] = []
+    distances: List[float] = []
+    for i, key in enumerate(keys):
+        for nkey, distance in nearby[key].items():
+            indices.append(index[nkey])
+            distances.append(distance)
+        indptr[i + 1] = len(indices)
+    return (
+        indptr,
+        np.array(indices, dtype=np.int32),
+        np.array(distances, dtype=np.float64),
+    )
+
+
+def from_csr(
+    keys: List, indptr: np.ndarray, indices: np.ndarray, distances: np.ndarray
+) -> Dict:
+    indptr_list = indptr.tolist()
+    indices_list = indices.tolist()
+    distances_list = distances.tolist()
+    nearby = {}
+    for i, key in enumerate(keys):
+        start, end = indptr_list[i], indptr_list[i + 1]
+        nearby[key] = {
+            keys[j]: d
+            for j, d in zip(indices_list[start:end], distances_list[start:end])
+        }
+    return nearby
+
+
+def compile_bundle(mapName: str, mapEntity: Dict, generalData: Dict) -> None:
+    arrays: Dict[str, np.ndarray] = {}
+    meta: Dict = {
+        "version": BUNDLE_VERSION,
+        "hash": bundle_hash(mapName, mapEntity, generalData),
+        "mapName": mapName,
+        # the scalar scoring constants, the unit data stays in general.json
+        "constants": {
+            key: value
+            for key, value in generalData.items()
+            if isinstance(value, (int, float))
+        },
+    }
+    if mapName in [MN.gSandbox, MN.sSandbox]:
+        map_limiter = MapLimiter(
+            latitudeMin=mapEntity[MK.border][MK.latitudeMin],
+            latitudeMax=mapEntity[MK.border][MK.latitudeMax],
+            longitudeMin=mapEntity[MK.border][MK.longitudeMin],
+            longitudeMax=mapEntity[MK.border][MK.longitudeMax],
+        )
+        hotspot_cache = build_hotspot_cache(mapEntity, generalData)
+        hotspot_keys = list(hotspot_cache)
+        hotspots = list(hotspot_cache.values())
+        arrays["hotspot_latitude"] = np.array([h[CK.latitude] for h in hotspots])
+        arrays["hotspot_longitude"] = np.array([h[CK.longitude] for h in hotspots])
+        arrays["hotspot_spread"] = np.array([h[HK.spread] for h in hotspots])
+        arrays["hotspot_footfall"] = np.array([h[LK.footfall] for h in hotspots])
+        (
+            arrays["hotspot_indptr"],
+            arrays["hotspot_indices"],
+            arrays["hotspot_distances"],
+        ) = to_csr(
+            hotspot_keys, {key: hotspot_cache[key][KW.nearby] for key in hotspot_keys}
+        )
+        locations = find_possible_locations(hotspot_cache, map_limiter)
+    else:
+        locations = mapEntity[LK.locations]
+        types = sorted({location[LK.locationType] for location in locations.values()})
+        meta["types"] = types
+        arrays["type_index"] = np.array(
+            [types.index(location[LK.locationType]) for location in locations.values()],
+            dtype=np.int8,
+        )
+        arrays["footfall"] = np.array(
+            [location[LK.footfall] for location in locations.values()]
+        )
+        arrays["sales_volume"] = np.array(
+            [location[LK.salesVolume] for location in locations.values()]
+        )
+
+    keys = list(locations)
+    arrays["keys"] = np.array(keys, dtype=str)
+    arrays["latitude"] = np.array([loc[CK.latitude] for loc in locations.values()])
+    arrays["longitude"] = np.array([loc[CK.longitude] for loc in locations.values()])
+    distance_cache = build_distance_cache(locations, generalData)
+    arrays["indptr"], arrays["indices"], arrays["distances"] = to_csr(
+        keys, distance_cache
+    )
+
+    # written next to the bundle and swapped in when complete
+    folder = bundle_folder(mapName)
+    temporary = f"{folder}.{os.getpid()}.tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    for name, array in arrays.items():
+        np.save(f"{temporary}/{name}.npy", array)
+    with open(f"{temporary}/meta.json", "w", encoding="utf8") as f:
+        json.dump(meta, f)
+    # another process may compile the same map, its bundle is as good
+    current = read_meta(folder)
+    if current is None or current.get("hash") != meta["hash"]:
+        shutil.rmtree(folder, ignore_errors=True)
+        try:
+            os.replace(temporary, folder)
+            return
+        except OSError:
+            current = read_meta(folder)
+            if current is None or current.get("hash") != meta["hash"]:
+                raise
+    shutil.rmtree(temporary, ignore_errors=True)
+
+
+class MapBundle:
+    def __init__(self, folder: str, meta: Dict) -> None:
+        self.folder = folder
+        self.meta = meta
+        self.arrays: Dict[str, np.ndarray] = {}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        # arrays are memory mapped on first use
+        if name not in self.arrays:
+            self.arrays[name] = np.load(f"{self.folder}/{name}.npy", mmap_mode="r")
+        return self.arrays[name]
+
+    @property
+    def keys(self) -> List[str]:
+        return self["keys"].tolist()
+
+    def distance_cache(self) -> Dict[str, Dict]:
+        return from_csr(self.keys, self["indptr"], self["indices"], self["distances"])
+
+    def possible_locations(self) -> Dict[str, Dict]:
+        return {
+            key: bundle(latitude=latitude, longitude=longitude)
+            for key, latitude, longitude in zip(
+                self.keys, self["latitude"].tolist(), self["longitude"].tolist()
+            )
+        }
+
+    def hotspot_cache(self, mapEntity: Dict) -> Dict:
+        hotspot_keys = list(range(len(mapEntity[HK.hotspots])))
+        nearby = from_csr(
+            hotspot_keys,
+            self["hotspot_indptr"],
+            self["hotspot_indices"],
+            self["hotspot_distances"],
+        )
+        hotspot_cache = {}
+        for key, hotspot in enumerate(mapEntity[HK.hotspots]):
+            hotspot_cache[key] = hotspot
+            hotspot[KW.nearby] = nearby[key]
+        return hotspot_cache
+
+
+def read_meta(folder: str) -> Optional[Dict]:
+    try:
+        with open(f"{folder}/meta.json", "r", encoding="utf8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_bundle(mapName: str, mapEntity: Dict, generalData: Dict) -> MapBundle:
+    folder = bundle_folder(mapName)
+    meta = read_meta(folder)
+    if (
+        meta is None
+        or meta.get("version") != BUNDLE_VERSION
+        or meta.get("hash") != bundle_hash(mapName, mapEntity, generalData)
+    ):
+        print(f"compiling map bundle for {mapName}")
+        compile_bundle(mapName, mapEntity, generalData)
+        meta = read_meta(folder)
+    return MapBundle(folder, meta or {})
+
+
+def distance_cache(mapName: str, mapEntity: Dict, generalData: Dict) -> Dict:
+    # the distance cache of the map locations, from the bundle when enabled
+    if Settings.map_bundle:
+        return load_bundle(mapName, mapEntity, generalData).distance_cache()
+    return build_distance_cache(mapEntity[LK.locations], generalData)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2:
+        with open(f"{Settings.cache_folder}/{sys.argv[1]}.json", encoding="utf8") as f:
+            mapEntity = json.load(f)
+        with open(f"{Settings.cache_folder}/general.json", encoding="utf8") as f:
+            generalData = json.load(f)
+        compile_bundle(sys.argv[1], mapEntity, generalData)
+    else:
+        print("Wrong number of arguments")
@@ -0,0 +1,184 @@
+import argparse
+import contextlib
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from data_keys import ALL_MAPS
+from settings import Settings
+
+
+def current_best(mapName: str) -> Optional[float]:
+    from best import best
+
+    try:
+        return best(mapName)[0]
+    except (OSError, ValueError):
+        return None
+
+
+def run_slice(
+    mapName: str, seconds: float, annealed: float = 0.0
+) -> Tuple[Optional[float], Optional[float], float]:
+    # runs in a worker process, the output goes to log/<map>.out
+    before = current_best(mapName)
+    start = time.perf_counter()
+    path = f"{Settings.log_folder}/{mapName}.out"
+    with open(path, "a", encoding="utf8") as out, contextlib.redirect_stdout(out):
+        if before is None:
+            # nothing to anneal yet, the solver gets the slice and stores a
+            # starting game for the next one
+            from main import main
+
+            main(mapName, seconds)
+        else:
+            from annealing import anneal
+
+            # the slices of a map share one cooling schedule
+            anneal(mapName, seconds, annealed, Settings.orchestrate_horizon)
+        # pool workers exit without running atexit
+        import events
+        import store
+
+        store.flush()
+        if Settings.auto_submit:
+            import auto_submit
+
+            auto_submit.flush()
+        events.flush()
+    return before, current_best(mapName), time.perf_counter() - start
+
+
+class MapProgress:
+    def __init__(self, mapName: str, total: Optional[float]) -> None:
+        self.mapName = mapName
+        self.start_total = total
+        self.total = total
+        # gain per second, unknown until the map has run once
+        self.rate = math.inf
+        self.slices = 0
+        self.seconds = 0.0
+        # seconds of annealing, the solver slice of a new map is not counted
+        self.annealed = 0.0
+        self.last_run = 0
+
+    @property
+    def gain(self) -> float:
+        if self.total is None or self.start_total is None:
+            return 0.0
+        return self.total - self.start_total
+
+
+class Orchestrator:
+    def __init__(self, maps: List[str], seconds: float, workers: int) -> None:
+        self.seconds = seconds
+        # one slice per map at a time, more workers would idle
+        self.workers = max(1, min(workers, len(maps)))
+        self.progress = {
+            mapName: MapProgress(mapName, current_best(mapName)) for mapName in maps
+        }
+        self.finished = 0
+
+    def pick(self, running: List[str]) -> Optional[str]:
+        idle = [p for p in self.progress.values() if p.mapName not in running]
+        if len(idle) == 0:
+            return None
+        # a map that keeps losing to the others still gets a slice now and then
+        starving = [
+            p
+            for p in idle
+            if self.finished - p.last_run >= Settings.orchestrate_max_skip
+        ]
+        candidates = starving or idle
+        return max(candidates, key=lambda p: (p.rate, -p.last_run)).mapName
+
+    def update(
+        self,
+        mapName: str,
+        before: Optional[float],
+        after: Optional[float],
+        elapsed: float,
+    ) -> None:
+        p = self.progress[mapName]
+        self.finished += 1
+        if p.start_total is None:
+            p.start_total = before if before is not None else after
+        if after is not None:
+            p.total = after
+        p.slices += 1
+        p.seconds += elapsed
+        if before is not None:
+            p.annealed += elapsed
+        p.last_run = self.finished
+        gain = 0.0
+        if before is not None and after is not None:
+            gain = after - before
+        rate = gain / elapsed if elapsed > 0 else 0.0
+        if math.isinf(p.rate):
+            p.rate = rate
+        else:
+            s = Settings.orchestrate_smoothing
+            p.rate = s * rate + (1 - s) * p.rate
+
+    def report(self, elapsed: float) -> None:
+        print(f"--- {elapsed / 60:.1f} min, {self.finished} slices")
+        for p in sorted(self.progress.values(), key=lambda p: -p.gain):
+            total = "-" if p.total is None else f"{p.total:.2f}"
+            rate = "-" if math.isinf(p.rate) else f"{p.rate:.3f}/s"
+            print(
+                f"{p.mapName:<10}\t{total}\t{p.gain:+.2f}\t{rate}\t"
+                f"{p.slices} slices\t{p.seconds:.0f}s"
+            )
+        print(f"total gain {sum(p.gain for p in self.progress.values()):+.2f}")
+
+    def run(self, duration: Optional[float]) -> None:
+        os.makedirs(Settings.log_folder, exist_ok=True)
+        start = time.perf_counter()
+        running: Dict[Future, str] = {}
+        print(f"Orchestrating {len(self.progress)} maps with {self.workers} workers")
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                while True:
+                    expired = (
+                        duration is not None and time.perf_counter() - start > duration
+                    )
+                    while not expired and len(running) < self.workers:
+                        mapName = self.pick(list(running.values()))
+                        if mapName is None:
+                            break
+                        future = pool.submit(
+                            run_slice,
+                            mapName,
+                            self.seconds,
+                            self.progress[mapName].annealed,
+                        )
+                        running[future] = mapName
+                    if len(running) == 0:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        mapName = running.pop(future)
+                        try:
+                            self.update(mapName, *future.result())
+                        except Exception as e:
+                            print(f"{mapName} failed: {e}")
+                            self.update(mapName, None, None, self.seconds)
+                    self.report(time.perf_counter() - start)
+            except KeyboardInterrupt:
+                print("Stopping, waiting for the running slices")
+                pool.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Keep annealing all maps in a process pool"
+    )
+    parser.add_argument("maps", nargs="*", default=ALL_MAPS)
+    parser.add_argument("--seconds", type=float, default=Settings.orchestrate_slice)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--hours", type=float, help="stop after this long")
+    args = parser.parse_args()
+    duration = args.hours * 3600 if args.hours else None
+    Orchestrator(args.maps, args.seconds, args.workers).run(duration)
@@ -1,9 +1,248 @@
+import argparse
+import collections
+import contextlib
 import cProfile
+import os
+import pstats
+import signal
+import sys
+import time
+from types import FrameType
+from typing import Callable, Dict, List, Optional, Tuple
 
-from main import main
-from data_keys import MapNames as MN
+from data_keys import (
+    LocationKeys as LK,
+    MapKeys as MK,
+    MapNames as MN,
+)
+from settings import Settings
+
+PHASES = ["cache", "iteration", "solve", "jiggle"]
+
+
+class Sampler:
+    # samples the stack on a cpu time timer, the counts are written in the
+    # collapsed format that flamegraph.pl and speedscope read. a sampling
+    # thread would only get the gil where the solver releases it, so the
+    # samples are taken in a signal handler on the main thread instead
+    def __init__(self, interval: float) -> None:
+        if not hasattr(signal, "setitimer"):
+            raise SystemExit("Sampling needs signal.setitimer, use pstats instead")
+        self.interval = interval
+        self.counts: Dict[str, int] = collections.Counter()
+
+    def sample(self, _: int, frame: Optional[FrameType]) -> None:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            name = os.path.basename(code.co_filename)
+            stack.append(f"{code.co_name} ({name}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if stack:
+            self.counts[";".join(reversed(stack))] += 1
+
+    def __enter__(self) -> "Sampler":
+        self.previous = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return self
+
+    def __exit__(self, *_) -> None:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.previous)
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf8") as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+
+def make_solver(mapName: str, mapEntity: Dict, generalData: Dict):
+    from regular_solver import RegularSolver
+    from sandbox_solver import SandboxSolver
+
+    if mapName in [MN.gSandbox, MN.sSandbox]:
+        return SandboxSolver(mapName, mapEntity, generalData)
+    return RegularSolver(mapName, mapEntity, generalData)
+
+
+def jiggle_steps(
+    mapName: str, mapEntity: Dict, generalData: Dict, steps: int
+) -> Callable[[], None]:
+    # the fast_jiggle step functions on the best game, every step rolled back
+    from benchmark import stored_solution
+    from fast_jiggle import jiggle_regular, jiggle_sandbox
+    from map_bundle import distance_cache as map_distance_cache
+    from map_limiter import MapLimiter
+    from undo_log import UndoLog
+
+    solution = stored_solution(mapName)
+    if solution is None:
+        raise SystemExit(f"No stored game for {mapName} to jiggle")
+    log = UndoLog()
+    if mapName in [MN.gSandbox, MN.sSandbox]:
+        map_limiter = MapLimiter(**mapEntity[MK.border])
+        names = {key: key for key in solution[LK.locations]}
+        hotspot_footfall_cache: Dict = {}
+
+        def step() -> None:
+            jiggle_sandbox(
+                mapName,
+                solution,
+                mapEntity,
+                generalData,
+                map_limiter,
+                names,
+                hotspot_footfall_cache,
+                log,
+            )
+
+    else:
+        distance_cache = map_distance_cache(mapName, mapEntity, generalData)
+
+        def step() -> None:
+            jiggle_regular(
+                mapName, solution, mapEntity, generalData, distance_cache, log
+            )
+
+    def run() -> None:
+        for _ in range(steps):
+            step()
+            log.rollback()
+
+    return run
+
+
+def prepare(
+    mapName: str, phase: str, iterations: int, steps: int
+) -> Callable[[], None]:
+    # everything up to the phase is set up here and not profiled
+    from cli import load_data
+
+    mapEntity, generalData = load_data(mapName)
+    if phase == "jiggle":
+        return jiggle_steps(mapName, mapEntity, generalData, steps)
+    solver = make_solver(mapName, mapEntity, generalData)
+    if phase == "cache":
+        solver.initialize()
+        return solver.rebuild_cache
+    solver.initialize()
+    if phase == "iteration":
+        return solver.find_scored_suggestions
+    return lambda: solver.solve(iterations)
+
+
+def profile(
+    mapName: str,
+    phase: str,
+    iterations: int,
+    steps: int,
+    folder: str,
+    sample: bool,
+    interval: float,
+) -> Tuple[str, float]:
+    run = prepare(mapName, phase, iterations, steps)
+    os.makedirs(folder, exist_ok=True)
+    name = f"{folder}/{mapName}-{phase}-{time.strftime('%Y%m%d-%H%M%S')}"
+    start = time.perf_counter()
+    if sample:
+        # no cProfile overhead, the call counts are lost instead
+        with Sampler(interval) as sampler:
+            run()
+        path = f"{name}.folded"
+        sampler.write(path)
+    else:
+        profiler = cProfile.Profile()
+        profiler.runcall(run)
+        path = f"{name}.pstats"
+        profiler.dump_stats(path)
+    return path, time.perf_counter() - start
+
+
+def function_times(path: str) -> Dict[Tuple, Tuple[float, float, int]]:
+    # (file, line, function) -> (tottime, cumtime, calls)
+    stats = pstats.Stats(path).stats  # type: ignore
+    return {
+        function: (tottime, cumtime, calls)
+        for function, (_, calls, tottime, cumtime, _) in stats.items()
+    }
+
+
+def diff(old: str, new: str, sort: str, top: int) -> List[str]:
+    before = function_times(old)
+    after = function_times(new)
+    column = 0 if sort == "tottime" else 1
+    rows = []
+    for function in set(before) | set(after):
+        a = before.get(function, (0.0, 0.0, 0))
+        b = after.get(function, (0.0, 0.0, 0))
+        rows.append((b[column] - a[column], function, a, b))
+    rows.sort(key=lambda row: row[0], reverse=True)
+    total_before = sum(times[0] for times in before.values())
+    total_after = sum(times[0] for times in after.values())
+    lines = [
+        f"total {total_before:.3f}s -> {total_after:.3f}s",
+        f"{'delta':>9}{'before':>9}{'after':>9}{'calls':>24}  function",
+    ]
+    # the largest regressions first, then the largest improvements
+    shown = rows[:top] + [row for row in rows[-top:] if row not in rows[:top]]
+    for delta, (file, line, function), a, b in shown:
+        if delta == 0:
+            continue
+        calls = f"{a[2]} -> {b[2]}"
+        lines.append(
+            f"{delta:>+9.3f}{a[column]:>9.3f}{b[column]:>9.3f}{calls:>24}"
+            f"  {function} ({os.path.basename(file)}:{line})"
+        )
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Profile the solver and scorers")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="profile a phase on a map")
+    run.add_argument("map")
+    run.add_argument("--phase", choices=PHASES, default="iteration")
+    run.add_argument("--iterations", type=int, default=5, help="for solve")
+    run.add_argument("--steps", type=int, default=1000, help="for jiggle")
+    run.add_argument("--output", default=Settings.profile_folder)
+    run.add_argument(
+        "--sample", action="store_true", help="collapsed stacks instead of pstats"
+    )
+    run.add_argument("--interval", type=float, default=Settings.profile_interval)
+    run.add_argument("--sort", default="cumulative")
+    run.add_argument("--top", type=int, default=30)
+    run.add_argument("--no-bundle", action="store_true", help="build caches again")
+
+    compare = commands.add_parser("diff", help="compare two pstats files")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.add_argument("--sort", choices=["tottime", "cumtime"], default="tottime")
+    compare.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.command == "diff":
+        print("\n".join(diff(args.old, args.new, args.sort, args.top)))
+        return 0
+
+    if args.no_bundle:
+        Settings.map_bundle = False
+    # the code under test prints progress, keep stdout for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        path, seconds = profile(
+            args.map,
+            args.phase,
+            args.iterations,
+            args.steps,
+            args.output,
+            args.sample,
+            args.interval,
+        )
+    print(f"{path}\t{seconds:.2f}s")
+    if not args.sample:
+        pstats.Stats(path).sort_stats(args.sort).print_stats(args.top)
+    return 0
 
 
 if __name__ == "__main__":
-    cProfile.run("main(MN.gSandbox)")
-    # cProfile.run("main(MN.goteborg)")
+    sys.exit(main())
@@ -1,9 +1,13 @@
-from typing import Callable, Dict, Generator, Iterable, List
+import itertools
+from typing import Callable, Dict, Generator, Iterable, List, Set
 from data_keys import (
     LocationKeys as LK,
     GeneralKeys as GK,
 )
-from helper import build_distance_cache, bundle
+from events import emit
+from helper import bundle, count_bundle
+from key_table import KeyTable
+from map_bundle import distance_cache
 from scoring import calculateScore
 from original_scoring import calculateScore as originalCalculateScore
 from settings import Settings
@@ -14,23 +18,25 @@ from suggestion import ScoredSuggestion, Suggestion, STag
 class RegularSolver(Solver):
     def __init__(self, mapName: str, mapEntity: Dict, generalData: Dict) -> None:
         super().__init__(mapName=mapName, mapEntity=mapEntity, generalData=generalData)
+        # locations settled by presolve, the search leaves them alone
+        self.fixed: Set[str] = set()
+        self.searchable: List[str] = list(mapEntity[LK.locations])
 
     def list_actions(
         self,
     ) -> List[Callable[[List[ScoredSuggestion]], Iterable[Suggestion]]]:
+        if Settings.sweep:
+            return [self.sweep_configurations, self.group_scored_suggestions]
         return [self.find_suggestions, self.group_scored_suggestions]
 
-    def calculate(self, suggestion: Suggestion) -> ScoredSuggestion:
-        return ScoredSuggestion(
-            suggestion=suggestion,
-            score=calculateScore(
-                self.mapName,
-                self.solution,
-                suggestion.change,
-                self.mapEntity,
-                self.generalData,
-                self.distance_cache,
-            ),
+    def score_change(self, change: Dict[str, Dict]) -> Dict[str, Dict]:
+        return calculateScore(
+            self.mapName,
+            self.solution,
+            change,
+            self.mapEntity,
+            self.generalData,
+            self.distance_cache,
         )
 
     def calculate_verification(self) -> Dict[str, Dict]:
@@ -43,6 +49,18 @@ class RegularSolver(Solver):
         if Settings.starting_point == "func":
             self.solution = self.starting_point()
         self.rebuild_cache()
+        if Settings.decompose:
+            from components import decompose
+
+            self.solution = decompose(
+                self.mapName,
+                self.mapEntity,
+                self.generalData,
+                self.distance_cache,
+                self.solution,
+            )
+        if Settings.presolve:
+            self.presolve()
         if Settings.starting_point == "func":
             suggestion = Suggestion(change={}, tag=STag.start)
             scored_suggestion = self.calculate(suggestion)
@@ -72,47 +90,145 @@ class RegularSolver(Solver):
             solution[LK.locations][name] = bundle(f3=f3, f9=f9)
         return solution
 
+    def presolve(self) -> None:
+        # a location without neighbours shares its sales and footfall with
+        # nobody, once it is used its best configuration only depends on its
+        # own sales volume. if that earns something it is used, as long as
+        # the rest of the map does not lose money
+        from components import best_active_counts
+        from incremental_scoring import ScoreConstants
+
+        constants = ScoreConstants(self.generalData)
+        sales_factor = self.generalData[GK.refillSalesFactor]
+        locations = self.solution[LK.locations]
+        for key, location in self.mapEntity[LK.locations].items():
+            if self.distance_cache[key]:
+                continue
+            sales_volume = location[LK.salesVolume] * sales_factor
+            (f3, f9), value = best_active_counts(constants, sales_volume)
+            if value > 0:
+                locations[key] = bundle(f3=f3, f9=f9)
+                self.fixed.add(key)
+        self.searchable = [
+            key for key in self.mapEntity[LK.locations] if key not in self.fixed
+        ]
+        total = len(self.mapEntity[LK.locations])
+        emit(
+            "presolve",
+            mapName=self.mapName,
+            fixed=len(self.fixed),
+            locations=total,
+            fraction=len(self.fixed) / total if total else 0.0,
+        )
+
     def rebuild_cache(self) -> None:
-        locations = self.mapEntity[LK.locations]
-        self.distance_cache = build_distance_cache(locations, self.generalData)
+        self.distance_cache = distance_cache(
+            self.mapName, self.mapEntity, self.generalData
+        )
+        self.key_table = KeyTable(self.distance_cache)
 
     def generate_changes(
         self, locations: Dict[str, Dict]
     ) -> Generator[Suggestion, None, None]:
-        for key in (key for key in locations if key not in self.the_ugly):
+        fixed = self.fixed
+        skipped = fixed | self.ignored_keys()
+        for key in (k for k in locations if k not in skipped):
             location = locations[key]
             f3Count = location[LK.f3100Count]
             f9Count = location[LK.f9100Count]
             if f3Count > 0:  # decrease f3100
-                yield Suggestion(change={key: bundle(-1, 0)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(-1, 0)}, tag=STag.change)
             if f3Count > 0 and f9Count < Settings.max_stations:  # f3100 -> f9100
-                yield Suggestion(change={key: bundle(-1, 1)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(-1, 1)}, tag=STag.change)
             if f3Count > 1 and f9Count < Settings.max_stations:  # 2 f3100 -> f9100
-                yield Suggestion(change={key: bundle(-2, 1)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(-2, 1)}, tag=STag.change)
             if f9Count > 0 and f3Count < Settings.max_stations:  # f9100 -> f3100
-                yield Suggestion(change={key: bundle(1, -1)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(1, -1)}, tag=STag.change)
             if f9Count > 0 and f3Count == 0:  # f9100 -> 2 f3100
-                yield Suggestion(change={key: bundle(2, -1)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(2, -1)}, tag=STag.change)
             if f3Count < Settings.max_stations:  # increase f3100
-                yield Suggestion(change={key: bundle(1, 0)}, tag=STag.change)
-        for key in (
-            key for key in self.mapEntity[LK.locations] if key not in self.the_ugly
-        ):  # try to add a missing location
-            if key not in locations:
-                yield Suggestion(change={key: bundle(1, 0)}, tag=STag.change)
-                yield Suggestion(change={key: bundle(2, 0)}, tag=STag.change)
-                yield Suggestion(change={key: bundle(0, 1)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(1, 0)}, tag=STag.change)
+        for key in self.allowed():  # try to add a missing location
+            if key not in locations and key not in fixed:
+                yield Suggestion(change={key: count_bundle(1, 0)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(2, 0)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(0, 1)}, tag=STag.change)
 
     def find_suggestions(self, _: List[ScoredSuggestion]) -> List[Suggestion]:
         suggestions = []
         for change in self.generate_changes(self.solution[LK.locations]):
             suggestions.append(change)
         if self.stale_progress:
-            for change in self.generate_moves(self.mapEntity[LK.locations]):
+            for change in self.generate_moves(self.searchable):
                 suggestions.append(change)
-            for change in self.generate_consolidation(self.mapEntity[LK.locations]):
+            for change in self.generate_consolidation(self.searchable):
                 suggestions.append(change)
         return suggestions
 
+    def sweep_configurations(self, scored: List[ScoredSuggestion]) -> List[Suggestion]:
+        # all configurations of every location, or of every pair of neighbours
+        # with sweep_block 2, evaluated on one incremental state. the best
+        # improvements that don't touch each other's sales become one group
+        from components import CONFIGURATIONS
+        from incremental_scoring import RegularState
+
+        state = RegularState(
+            self.mapEntity, self.generalData, self.distance_cache, self.solution
+        )
+        base = state.total
+        improvements = []
+        for block in self.sweep_blocks():
+            current = [state.get_counts(key) for key in block]
+            best_gain, best_counts = 0.0, None
+            for counts in itertools.product(CONFIGURATIONS, repeat=len(block)):
+                if list(counts) == current:
+                    continue
+                for key, (f3, f9) in zip(block, counts):
+                    state.set_counts(key, f3, f9)
+                gain = state.total - base
+                if gain > best_gain:
+                    best_gain, best_counts = gain, counts
+            for key, (f3, f9) in zip(block, current):
+                state.set_counts(key, f3, f9)
+            if best_counts is not None:
+                change = {
+                    key: count_bundle(f3 - old[0], f9 - old[1])
+                    for key, (f3, f9), old in zip(block, best_counts, current)
+                    if (f3, f9) != old
+                }
+                improvements.append((best_gain, change))
+
+        if len(improvements) == 0:
+            # nothing left for single locations, search the usual way
+            return self.find_suggestions(scored)
+        improvements.sort(key=lambda improvement: improvement[0], reverse=True)
+        group: Dict[str, Dict] = {}
+        touched: Set[str] = set()
+        for _, change in improvements:
+            affected = set().union(*(state.affected(key) for key in change))
+            if affected & touched:
+                continue
+            touched |= affected
+            group.update(change)
+        suggestions = [Suggestion(change=improvements[0][1], tag=STag.change)]
+        if len(group) > len(improvements[0][1]):
+            suggestions.append(Suggestion(change=group, tag=STag.group))
+        return suggestions
+
+    def sweep_blocks(self) -> Generator[List[str], None, None]:
+        for key in self.searchable:
+            if Settings.sweep_block == 1:
+                yield [key]
+                continue
+            partners = [
+                nkey for nkey in self.distance_cache[key] if nkey not in self.fixed
+            ]
+            # a location without a partner is swept on its own
+            if len(partners) == 0:
+                yield [key]
+            for nkey in partners:
+                if key < nkey:
+                    yield [key, nkey]
+
     def post_improvement(self, change):
         return super().post_improvement(change)
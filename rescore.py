@@ -14,7 +14,7 @@ from submit import load_game, get_solution
 from api import getGeneralData, getMapData
 
 load_dotenv()
-apiKey = os.environ["apiKey"]
+apiKey = os.environ.get("apiKey", "")
 
 
 def verify(id: str) -> None:
@@ -1,5 +0,0 @@
-from main import main, MN
-
-
-if __name__ == "__main__":
-    main(MN.london)
@@ -1,6 +0,0 @@
-from main import main, MN
-
-
-if __name__ == "__main__":
-    # may need groups turned off
-    main(MN.uppsala)
@@ -1,4 +1,4 @@
-from typing import Callable, Dict, Generator, Iterable, List
+from typing import Callable, Dict, Generator, Iterable, List, Tuple
 from data_keys import (
     CoordinateKeys as CK,
     GeneralKeys as GK,
@@ -6,7 +6,10 @@ from data_keys import (
     MapKeys as MK,
     ScoringKeys as SK,
 )
-from helper import apply_change, build_distance_cache, bundle
+from events import emit
+from helper import apply_change, build_distance_cache, bundle, count_bundle
+from key_table import KeyTable
+from map_bundle import load_bundle
 from map_limiter import MapLimiter
 from sandbox_helper import build_hotspot_cache, find_possible_locations, temporary_names
 from scoring import calculateScore
@@ -22,29 +25,47 @@ class SandboxSolver(Solver):
 
         self.hotspot_cache: Dict = {}
         self.hotspot_footfall_cache: Dict = {}
+        # temporary names of the solution locations, kept until it changes
+        self.names: Dict[str, str] = {}
+        self.inverse: Dict[str, str] = {}
         self.possible_locations: Dict[str, Dict] = {}
         self.no_remove = False
 
-    def calculate(
-        self, suggestion: Suggestion, skip_validation=True
-    ) -> ScoredSuggestion:
-        names, inverse = temporary_names(self.solution, suggestion.change)
-        return ScoredSuggestion(
-            suggestion=suggestion,
-            score=calculateScore(
-                mapName=self.mapName,
-                solution=self.solution,
-                change=suggestion.change,
-                mapEntity=self.mapEntity,
-                generalData=self.generalData,
-                distance_cache=self.distance_cache,
-                sandbox_names=names,
-                inverse_sandbox_names=inverse,
-                skip_validation=skip_validation,
-                hotspot_footfall_cache=self.hotspot_footfall_cache,
-            ),
+    def score_change(
+        self, change: Dict[str, Dict], skip_validation=True
+    ) -> Dict[str, Dict]:
+        names, inverse = self.temporary_names(change)
+        return calculateScore(
+            mapName=self.mapName,
+            solution=self.solution,
+            change=change,
+            mapEntity=self.mapEntity,
+            generalData=self.generalData,
+            distance_cache=self.distance_cache,
+            sandbox_names=names,
+            inverse_sandbox_names=inverse,
+            skip_validation=skip_validation,
+            hotspot_footfall_cache=self.hotspot_footfall_cache,
         )
 
+    def temporary_names(
+        self, change: Dict[str, Dict]
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        # same names as sandbox_helper.temporary_names without renaming the
+        # whole solution for every suggestion
+        new = [key for key in change if key not in self.names]
+        if len(new) == 0:
+            return self.names, self.inverse
+        names = self.names.copy()
+        inverse = self.inverse.copy()
+        i = len(names) + 1
+        for key in new:
+            name = f"location{i}"
+            names[key] = name
+            inverse[name] = key
+            i += 1
+        return names, inverse
+
     def list_actions(
         self,
     ) -> List[Callable[[List[ScoredSuggestion]], Iterable[Suggestion]]]:
@@ -84,8 +105,16 @@ class SandboxSolver(Solver):
         )
         self.update_limits()
         self.rebuild_cache()
+        self.names, self.inverse = temporary_names(self.solution, {})
 
     def rebuild_cache(self) -> None:
+        if Settings.map_bundle:
+            map_bundle = load_bundle(self.mapName, self.mapEntity, self.generalData)
+            self.hotspot_cache = map_bundle.hotspot_cache(self.mapEntity)
+            self.possible_locations = map_bundle.possible_locations()
+            self.distance_cache = map_bundle.distance_cache()
+            self.key_table = KeyTable(self.possible_locations)
+            return
         self.hotspot_cache = build_hotspot_cache(
             mapEntity=self.mapEntity, generalData=self.generalData
         )
@@ -95,6 +124,7 @@ class SandboxSolver(Solver):
         self.distance_cache = build_distance_cache(
             self.possible_locations, self.generalData
         )
+        self.key_table = KeyTable(self.possible_locations)
 
     def find_new_locations(self, _: List[ScoredSuggestion]) -> Iterable[Suggestion]:
         remaining_types = self.remaining_types_in_order()
@@ -103,7 +133,7 @@ class SandboxSolver(Solver):
         elif len(remaining_types) == 1:
             # get those last kiosks
             self.no_remove = True
-        print(self.limits)
+        emit("limits", level="debug", mapName=self.mapName, limits=self.limits)
 
         # try to add locations
         return self.generate_additions()
@@ -226,11 +256,13 @@ class SandboxSolver(Solver):
         #     raise SystemExit(f"!!!!!! {suggestion.total}")
 
         self.update_limits()
+        self.names, self.inverse = temporary_names(self.solution, {})
+        self.resize_masks()
         for key in suggestion.change:
             nearby = self.distance_cache[key]
             for nkey, distance in nearby.items():
                 if distance < Settings.sandbox_too_near:
-                    self.the_good.discard(nkey)
+                    self.the_good[self.key_table.intern(nkey)] = False
 
     def generate_additions(self) -> Generator[Suggestion, None, None]:
         types = self.remaining_types_in_order()
@@ -238,9 +270,9 @@ class SandboxSolver(Solver):
             return
         type = types[0]  # biggest type
         candidates = (
-            (key, location)
-            for key, location in self.possible_locations.items()
-            if key not in self.the_ugly
+            (key, self.possible_locations[key])
+            for key in self.allowed()
+            if key in self.possible_locations
         )
         f3 = 1
         f9 = 0
@@ -275,17 +307,17 @@ class SandboxSolver(Solver):
             f3Count = location[LK.f3100Count]
             f9Count = location[LK.f9100Count]
             if f3Count > 0:  # decrease f3100
-                yield Suggestion(change={key: bundle(-1, 0)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(-1, 0)}, tag=STag.change)
             if f3Count > 0 and f9Count < Settings.max_stations:  # f3100 -> f9100
-                yield Suggestion(change={key: bundle(-1, 1)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(-1, 1)}, tag=STag.change)
             if f3Count > 1 and f9Count < Settings.max_stations:  # 2 f3100 -> f9100
-                yield Suggestion(change={key: bundle(-2, 1)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(-2, 1)}, tag=STag.change)
             if f9Count > 0 and f3Count < Settings.max_stations:  # f9100 -> f3100
-                yield Suggestion(change={key: bundle(1, -1)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(1, -1)}, tag=STag.change)
             if f3Count < Settings.max_stations:  # increase f3100
-                yield Suggestion(change={key: bundle(1, 0)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(1, 0)}, tag=STag.change)
             if f9Count < Settings.max_stations:  # increase f9100
-                yield Suggestion(change={key: bundle(0, 1)}, tag=STag.change)
+                yield Suggestion(change={key: count_bundle(0, 1)}, tag=STag.change)
 
     def generate_swaps(
         self, locations: Dict[str, Dict]
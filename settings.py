@@ -8,7 +8,38 @@ class Settings:
     cache_folder = "cache"
     log_folder = "log"
     game_folder = "my_games"
+    api_timeout = 30.0
+    api_retries = 3
+    api_backoff = 0.5
+    api_pool_size = 8
+    submit_workers = 4
+    submit_rate = 2.0  # requests per second
+    auto_submit = False
+    auto_submit_interval = 300.0
+    auto_submit_threshold = 0.0001  # relative improvement since the last submit
+    auto_submit_tolerance = 0.0001  # relative difference between server and local
     starting_point = "func"
+    store_backend = "files"  # or "sqlite" or "archive"
+    database = "games.db"
+    archive_compression = "gzip"  # None, "gzip" or "lzma"
+    archive_snapshot_interval = 100
+    store_async = True
+    store_queue_size = 64
+    store_keep_all = False
+    best_sidecar_interval = 5.0  # seconds between writes of log/<map>.best
+    instrument = False  # per action counts and timings, see instrumentation.py
+    instrument_memory = False  # tracemalloc, slows the solver down
+    memory_interval = 10  # iterations between allocation snapshots
+    memory_frames = 1  # traceback depth of the allocation sites
+    memory_top = 10
+    events = True  # jsonl event stream in the log folder, see events.py
+    events_file = "events.jsonl"
+    events_level = "debug"
+    events_console_level = "info"
+    events_console_interval = 1.0  # seconds between console lines per event
+    events_buffer = 100  # lines kept before writing
+    events_flush_interval = 5.0
+    map_bundle = True  # compiled map arrays in the cache folder
     max_stations = 2
 
     do_sets = True
@@ -17,6 +48,13 @@ class Settings:
     group_size = 12
     # groups_distance_limit = 10.0
 
+    presolve = True  # settle locations without neighbours before searching
+    sweep = False  # all configurations per location each iteration
+    sweep_block = 1  # 2 sweeps pairs of neighbours, 81 configurations each
+    decompose = False  # start regular maps from a component by component solve
+    components_workers = 4
+    components_rounds = 20
+
     sandbox_explore_how_many = 16
     do_sandbox_groups = False
     sandbox_group_size = 2
@@ -25,6 +63,30 @@ class Settings:
     sandbox_too_near = 1.0
     granularity = 1e4
 
+    anneal_steps = 2_000_000
+    anneal_t_start = 1e-4
+    anneal_t_end = 1e-7
+    anneal_step_factor = 0.001
+    anneal_report_interval = 10.0
+    anneal_store_interval = 5.0
+
+    jiggle_sync_interval = 60.0
+
+    benchmark_baseline = "benchmark_baseline.json"
+    benchmark_tolerance = 0.2  # allowed slowdown of a median
+
+    profile_folder = "profiles"
+    profile_interval = 0.005  # cpu seconds between stack samples
+
+    fuzz_cases = 200  # random cases per map
+    fuzz_tolerance = 1e-9  # relative, totals and per location fields
+    fuzz_folder = "fuzz"
+
+    orchestrate_slice = 60.0  # seconds per map and slice
+    orchestrate_max_skip = 10  # slices a map may wait while others gain more
+    orchestrate_smoothing = 0.5
+    orchestrate_horizon = 3600.0  # annealing seconds per map to cool over
+
 
 @dataclass
 class KW:
@@ -2,18 +2,24 @@ import copy
 import itertools
 from multiprocessing import Pool
 from abc import ABC, abstractmethod
-import json
-from typing import Callable, Dict, Generator, Iterable, List, Set
+import time
+from typing import Callable, Dict, Generator, Iterable, List, Optional, Set
+
+import numpy as np
 
 from data_keys import (
     CoordinateKeys as CK,
     LocationKeys as LK,
     GeneralKeys as GK,
+    ScoringKeys as SK,
 )
-from helper import apply_change, bundle
+from events import emit
+from helper import apply_change, count_bundle
+from instrumentation import Instrumentation
+from key_table import KeyTable
 from settings import Settings
 from store import store
-from suggestion import ScoredSuggestion, Suggestion, STag
+from suggestion import ScoredSuggestion, Suggestion, STag, get_total
 
 
 class Solver(ABC):
@@ -29,10 +35,18 @@ class Solver(ABC):
 
         self.no_remove = False
         self.do_sets = Settings.do_sets
-        self.the_good: Set[str] = set()
-        self.the_bad: Set[str] = set()
-        self.the_ugly: Set[str] = set()
+        # location keys are interned, the masks below are indexed by their ids
+        self.key_table = KeyTable()
+        self.the_good = np.zeros(0, dtype=bool)
+        self.the_bad = np.zeros(0, dtype=bool)
+        self.the_ugly = np.zeros(0, dtype=bool)
         self.stale_progress = False
+        # per action counts and timings, None when switched off
+        self.instrumentation = (
+            Instrumentation(mapName)
+            if Settings.instrument or Settings.instrument_memory
+            else None
+        )
         super().__init__()
 
     @abstractmethod
@@ -46,9 +60,14 @@ class Solver(ABC):
         pass
 
     @abstractmethod
-    def calculate(self, suggestion: Suggestion) -> ScoredSuggestion:
+    def score_change(self, change: Dict[str, Dict]) -> Dict[str, Dict]:
         pass
 
+    def calculate(self, suggestion: Suggestion) -> ScoredSuggestion:
+        return ScoredSuggestion(
+            suggestion=suggestion, score=self.score_change(suggestion.change)
+        )
+
     @abstractmethod
     def initialize(self) -> None:
         self.location_type = {}
@@ -70,34 +89,92 @@ class Solver(ABC):
         else:
             scored_suggestions = map(self.calculate, suggestions)
         output = []
+        good: List[int] = []
+        bad: List[int] = []
+        intern = self.key_table.intern
         for scored_suggestion in scored_suggestions:
             if scored_suggestion.total > self.best:
                 for key in scored_suggestion.change:
-                    self.the_good.add(key)
+                    good.append(intern(key))
                     output.append(scored_suggestion)
             else:
                 for key in scored_suggestion.change:
-                    self.the_bad.add(key)
+                    bad.append(intern(key))
+        self.resize_masks()
+        self.the_good[good] = True
+        self.the_bad[bad] = True
         return output
 
-    def solve(self) -> None:
-        while True:
+    def resize_masks(self) -> None:
+        # keys interned while scoring extend the masks
+        n = len(self.key_table)
+        for name in ["the_good", "the_bad", "the_ugly"]:
+            mask = getattr(self, name)
+            if len(mask) < n:
+                padding = np.zeros(n - len(mask), dtype=bool)
+                setattr(self, name, np.concatenate([mask, padding]))
+
+    def ignored_keys(self) -> Set[str]:
+        # one pass over the mask, generators test their keys against the set
+        keys = self.key_table.keys
+        return {keys[id] for id in np.flatnonzero(self.the_ugly).tolist()}
+
+    def allowed(self) -> List[str]:
+        # interned keys that are not ignored, in interning order
+        self.resize_masks()
+        keys = self.key_table.keys
+        return [keys[id] for id in np.flatnonzero(~self.the_ugly).tolist()]
+
+    def find_scored_suggestions(self) -> List[ScoredSuggestion]:
+        # find and score suggestions in action order
+        scored_suggestions: List[ScoredSuggestion] = []
+        for action in self.list_actions():
+            if self.instrumentation is not None:
+                scored_suggestions += self.instrumentation.run(
+                    action, scored_suggestions, self.score_suggestions
+                )
+                continue
+            # empty changes can't improve anything
+            suggestions = (s for s in action(scored_suggestions) if s.change)
+            scored_suggestions += self.score_suggestions(suggestions)
+        if self.instrumentation is not None:
+            self.instrumentation.end_iteration(self.best)
+        return scored_suggestions
+
+    def solve(
+        self, iterations: Optional[int] = None, seconds: Optional[float] = None
+    ) -> None:
+        emit("phase", mapName=self.mapName, phase="solve", best=self.best)
+        # the iteration running at the deadline is finished
+        deadline = None if seconds is None else time.perf_counter() + seconds
+        iteration = 0
+        while iterations is None or iteration < iterations:
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            iteration += 1
             if self.do_sets:
                 # these will be ignored
-                self.the_ugly = self.the_bad.difference(self.the_good)
-                self.the_good = set()
+                self.resize_masks()
+                self.the_ugly = self.the_bad & ~self.the_good
+                self.the_good = np.zeros(len(self.key_table), dtype=bool)
             else:
-                self.the_ugly = set()
+                self.the_ugly = np.zeros(len(self.key_table), dtype=bool)
 
-            # find and score suggestions in action order
-            scored_suggestions: List[ScoredSuggestion] = []
-            for action in self.list_actions():
-                scored_suggestions += self.score_suggestions(action(scored_suggestions))
+            start = time.perf_counter()
+            scored_suggestions = self.find_scored_suggestions()
+            emit(
+                "iteration",
+                level="debug",
+                mapName=self.mapName,
+                seconds=time.perf_counter() - start,
+                improving=len(scored_suggestions),
+            )
 
             # safety check if too much ignoring has happened
             if len(scored_suggestions) == 0:
                 if self.do_sets:
                     self.do_sets = False
+                    emit("phase", mapName=self.mapName, phase="no_sets")
                     continue
                 else:
                     break
@@ -106,23 +183,37 @@ class Solver(ABC):
             best_candidate = max(scored_suggestions, key=lambda x: x.total)
 
             if best_candidate.total > self.best:
-                self.best = best_candidate.total
-                self.best_id = best_candidate.get_game_id()
-                print(f"change: {json.dumps(best_candidate.change, indent=4)}")
+                # the suggestions only kept the totals, score the winner again
+                score = self.score_change(best_candidate.change)
+                self.best = get_total(score)
+                self.best_id = score[SK.gameId]
+                emit(
+                    "improvement",
+                    mapName=self.mapName,
+                    total=self.best,
+                    id=self.best_id,
+                    tag=best_candidate.tag,
+                    change=best_candidate.change,
+                )
                 apply_change(
                     self.solution[LK.locations],
                     best_candidate.change,
                     no_remove=self.no_remove,
                 )
-                store(self.mapName, best_candidate.score)
+                store(self.mapName, score)
                 # self.stale_progress = False
                 self.post_improvement(best_candidate)
             elif self.do_sets:
                 self.do_sets = False
+                emit("phase", mapName=self.mapName, phase="no_sets")
             elif not self.stale_progress:
                 self.stale_progress = True
+                emit("phase", mapName=self.mapName, phase="stale")
             else:
                 break
+        emit("phase", mapName=self.mapName, phase="done", best=self.best)
+        if self.instrumentation is not None:
+            self.instrumentation.close()
 
     def group_scored_suggestions(
         self, scored_suggestions: List[ScoredSuggestion]
@@ -165,16 +256,16 @@ class Solver(ABC):
         return new_suggestions
 
     def generate_moves(
-        self, locations: Dict[str, Dict]
+        self, locations: Iterable[str]
     ) -> Generator[Suggestion, None, None]:
         adds = [
-            bundle(1, 0),
-            bundle(2, 0),
-            bundle(0, 1),
+            count_bundle(1, 0),
+            count_bundle(2, 0),
+            count_bundle(0, 1),
         ]
         rems = [
-            bundle(-1, 0),
-            bundle(0, -1),
+            count_bundle(-1, 0),
+            count_bundle(0, -1),
         ]
         for main_key in locations:
             main_location = self.solution[LK.locations].get(main_key)
@@ -195,18 +286,20 @@ class Solver(ABC):
                         change = {main_key: add, sub_key: rem}
                         yield Suggestion(change=change, tag=STag.change)
 
-    def generate_consolidation(self, locations) -> Generator[Suggestion, None, None]:
+    def generate_consolidation(
+        self, locations: Iterable[str]
+    ) -> Generator[Suggestion, None, None]:
         adds = [
-            bundle(1, 0),
-            bundle(2, 0),
-            bundle(0, 1),
-            # bundle(-1, 1),
-            bundle(1, 1),
-            bundle(2, 2),
+            count_bundle(1, 0),
+            count_bundle(2, 0),
+            count_bundle(0, 1),
+            # count_bundle(-1, 1),
+            count_bundle(1, 1),
+            count_bundle(2, 2),
         ]
         rems = [
-            bundle(-1, 0),
-            bundle(0, -1),
+            count_bundle(-1, 0),
+            count_bundle(0, -1),
         ]
         for main_key in locations:
             main_location = self.solution[LK.locations].get(main_key)
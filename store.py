@@ -1,20 +1,157 @@
-from typing import Dict
+import atexit
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
 from data_keys import ScoringKeys as SK
 import json
 
+import archive
+import database
+from best import index
+from events import emit
 from settings import Settings
 
 
+def write_game(score: Dict) -> None:
+    # compact and atomic so readers never see a half written game
+    path = f"{Settings.game_folder}/{score[SK.gameId]}.json"
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf8") as f:
+        json.dump(score, f, separators=(",", ":"))
+    os.replace(temporary, path)
+
+
+def write_log(mapName: str, scores: List[Dict]) -> None:
+    lines = [
+        f"{score[SK.gameScore][SK.total]} {score[SK.gameId]}\n" for score in scores
+    ]
+    with open(f"{Settings.log_folder}/{mapName}.txt", "a", encoding="utf8") as f:
+        f.write("".join(lines))
+    for score in scores:
+        index.record(mapName, score[SK.gameScore][SK.total], score[SK.gameId])
+
+
+def persist(mapName: str, scores: List[Dict]) -> None:
+    # not every entry point creates the folders like main does
+    for folder in [Settings.game_folder, Settings.log_folder]:
+        os.makedirs(folder, exist_ok=True)
+    if Settings.store_backend == "sqlite":
+        database.save_games(mapName, scores)
+    elif Settings.store_backend == "archive":
+        archive.append(mapName, scores)
+        write_log(mapName, scores)
+    else:
+        for score in scores:
+            write_game(score)
+        write_log(mapName, scores)
+
+
+class GameWriter:
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        # mapName -> scores waiting to be written, oldest first
+        self.queued: Dict[str, List[Dict]] = {}
+        self.size = 0
+        self.writing = 0
+        # batches that could not be persisted
+        self.failed = 0
+        # id -> score for everything not yet on disk, see load_game
+        self.pending: Dict[str, Dict] = {}
+        self.thread: Optional[threading.Thread] = None
+
+    def put(self, mapName: str, score: Dict) -> None:
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            scores = self.queued.setdefault(mapName, [])
+            if not Settings.store_keep_all or self.size >= Settings.store_queue_size:
+                # coalesce, only the latest improvement for the map is kept
+                for dropped in scores:
+                    del self.pending[dropped[SK.gameId]]
+                self.size -= len(scores)
+                scores.clear()
+            scores.append(score)
+            self.size += 1
+            self.pending[score[SK.gameId]] = score
+            self.condition.notify_all()
+
+    def take(self) -> List[Tuple[str, List[Dict]]]:
+        with self.condition:
+            while self.size == 0:
+                self.condition.wait()
+            batch = [(key, scores) for key, scores in self.queued.items() if scores]
+            self.queued = {}
+            self.writing = self.size
+            self.size = 0
+            return batch
+
+    def run(self) -> None:
+        while True:
+            batch = self.take()
+            try:
+                for mapName, scores in batch:
+                    # anything escaping here would end the thread and leave
+                    # flush waiting forever
+                    try:
+                        persist(mapName, scores)
+                    except Exception as e:
+                        with self.condition:
+                            self.failed += 1
+                        emit(
+                            "store_failed",
+                            level="error",
+                            mapName=mapName,
+                            error=f"{type(e).__name__}: {e}",
+                        )
+            finally:
+                with self.condition:
+                    for _, scores in batch:
+                        for score in scores:
+                            self.pending.pop(score[SK.gameId], None)
+                    self.writing = 0
+                    self.condition.notify_all()
+
+    def flush(self) -> None:
+        with self.condition:
+            while self.size > 0 or self.writing > 0:
+                self.condition.wait()
+
+    def get(self, id_: str) -> Optional[Dict]:
+        with self.condition:
+            return self.pending.get(id_)
+
+
+writer = GameWriter()
+atexit.register(writer.flush)
+
+
+def pending_game(id_: str) -> Optional[Dict]:
+    return writer.get(id_)
+
+
+def flush() -> None:
+    writer.flush()
+    index.save()
+
+
+def failures() -> int:
+    return writer.failed
+
+
 def store(mapName: str, score: Dict) -> None:
     id_ = score[SK.gameId]
     total = score[SK.gameScore][SK.total]
-    # formatted_total = "{:,}".format(int(total)).replace(",", " ")
-    print(f"{total}\t\t{id_}")
+    emit("store", level="debug", mapName=mapName, total=total, id=id_)
 
-    # Store solution locally for visualization
-    with open(f"{Settings.game_folder}\{id_}.json", "w", encoding="utf8") as f:
-        json.dump(score, f, indent=4)
-    # Log solution for easier management
-    with open(f"{Settings.log_folder}/{mapName}.txt", "a", encoding="utf8") as f:
-        total = score[SK.gameScore][SK.total]
-        f.write(f"{total} {id_}\n")
+    if Settings.auto_submit:
+        # imported here, auto_submit depends on submit which depends on store
+        from auto_submit import offer
+
+        offer(mapName, score)
+
+    if Settings.store_async:
+        writer.put(mapName, score)
+    else:
+        # Store solution locally for visualization and log it for easier management
+        persist(mapName, [score])
@@ -1,48 +1,43 @@
 import os
 import sys
 import json
-from typing import Dict
+import threading
+from typing import Dict, Optional, Set
 import api
 from dotenv import load_dotenv
 
 from data_keys import (
-    LocationKeys as LK,
     ScoringKeys as SK,
-    MapNames as MN,
-    CoordinateKeys as CK,
 )
+import archive
+import database
+from helper import get_solution
 from settings import Settings
-
+from store import pending_game
 
 load_dotenv()
-apiKey = os.environ["apiKey"]
+apiKey = os.environ.get("apiKey", "")
+submit_log_lock = threading.Lock()
 
 
 def load_game(id: str) -> Dict:
+    game = pending_game(id)
+    if game is not None:
+        return game
+    if Settings.store_backend == "sqlite":
+        game = database.load_game(id)
+        if game is None:
+            raise FileNotFoundError(f"Game {id} is not in {Settings.database}")
+        return game
+    if Settings.store_backend == "archive":
+        game = archive.load_game(id)
+        if game is None:
+            raise FileNotFoundError(f"Game {id} is not in any archive")
+        return game
     with open(f"{Settings.game_folder}/{id}.json", "r", encoding="utf8") as f:
         return json.load(f)
 
 
-def get_solution(game: Dict) -> Dict[str, Dict]:
-    locations = {}
-    mapName = game[SK.mapName]
-
-    for k, v in game[LK.locations].items():
-        if mapName not in [MN.gSandbox, MN.sSandbox]:
-            if v[LK.f3100Count] == 0 and v[LK.f9100Count] == 0:
-                continue
-        locations[k] = {
-            LK.f3100Count: v[LK.f3100Count],
-            LK.f9100Count: v[LK.f9100Count],
-        }
-        if mapName in [MN.gSandbox, MN.sSandbox]:
-            locations[k][LK.locationType] = v[LK.locationType]
-            locations[k][CK.latitude] = v[CK.latitude]
-            locations[k][CK.longitude] = v[CK.longitude]
-
-    return {LK.locations: locations}
-
-
 def submit(id: str) -> None:
     game = load_game(id)
     mapName = game[SK.mapName]
@@ -56,11 +51,50 @@ def submit(id: str) -> None:
         print(f"Score: {json.dumps(scoredSolution[SK.gameScore], indent=4)}")
         total = scoredSolution[SK.gameScore][SK.total]
         print("Total: {:,}".format(int(total)))
+        record_submission(mapName, total, id, game_id)
+
+
+def record_submission(mapName: str, total: float, id: str, game_id: str) -> None:
+    if Settings.store_backend == "sqlite":
+        database.record_submission(mapName, total, id, game_id)
+        return
+    # a single write of a whole line so that concurrent submitters don't interleave
+    with submit_log_lock:
         log_file = f"{Settings.log_folder}/submit.txt"
         with open(log_file, "a", encoding="utf8") as f:
             f.write(f"{mapName} {total} {id} {game_id}\n")
 
 
+def submitted(mapName: str) -> Set[str]:
+    if Settings.store_backend == "sqlite":
+        return database.submitted(mapName)
+    ids = set()
+    log_file = f"{Settings.log_folder}/submit.txt"
+    if os.path.exists(log_file):
+        with open(log_file, "r", encoding="utf8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[0] == mapName:
+                    ids.add(parts[2])
+    return ids
+
+
+def best_submitted(mapName: str) -> Optional[float]:
+    if Settings.store_backend == "sqlite":
+        return database.best_submitted(mapName)
+    best = None
+    log_file = f"{Settings.log_folder}/submit.txt"
+    if os.path.exists(log_file):
+        with open(log_file, "r", encoding="utf8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[0] == mapName:
+                    total = float(parts[1])
+                    if best is None or total > best:
+                        best = total
+    return best
+
+
 if __name__ == "__main__":
     if len(sys.argv) == 2:
         submit(sys.argv[1])
@@ -0,0 +1,99 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Tuple
+
+import api
+from data_keys import ALL_MAPS, ScoringKeys as SK
+from best import top
+from helper import get_solution
+from settings import Settings
+from submit import apiKey, best_submitted, load_game, record_submission, submitted
+
+
+class RateLimiter:
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next = 0.0
+
+    def wait(self) -> None:
+        # reserve the next slot under the lock, sleep outside of it
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next)
+            self.next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def pick(mapName: str, k: int) -> List[Tuple[float, str]]:
+    # only games that beat the best submission, a worse one would not count
+    done = submitted(mapName)
+    best = best_submitted(mapName)
+    try:
+        candidates = top(mapName, k + len(done))
+    except (OSError, ValueError):
+        return []
+    return [
+        (total, id)
+        for total, id in candidates
+        if id not in done and (best is None or total > best)
+    ][:k]
+
+
+def submit_one(
+    mapName: str, total: float, id: str, limiter: RateLimiter
+) -> Optional[float]:
+    solution = get_solution(load_game(id))
+    limiter.wait()
+    scoredSolution = api.submit(mapName, solution, apiKey)
+    if not scoredSolution:
+        return None
+    server_total = scoredSolution[SK.gameScore][SK.total]
+    record_submission(mapName, server_total, id, scoredSolution[SK.gameId])
+    return server_total
+
+
+def submit_all(maps: List[str], k: int, workers: int, rate: float) -> None:
+    jobs = [(mapName, total, id) for mapName in maps for total, id in pick(mapName, k)]
+    if len(jobs) == 0:
+        print("Nothing to submit")
+        return
+    print(f"Submitting {len(jobs)} games with {workers} workers")
+    limiter = RateLimiter(rate)
+    start = time.perf_counter()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(submit_one, mapName, total, id, limiter): (mapName, total, id)
+            for mapName, total, id in jobs
+        }
+        for future in as_completed(futures):
+            mapName, total, id = futures[future]
+            try:
+                server_total = future.result()
+            except Exception as e:
+                print(f"{mapName}\t{id}\tfailed: {e}")
+                failed += 1
+                continue
+            if server_total is None:
+                print(f"{mapName}\t{id}\tfailed")
+                failed += 1
+            else:
+                print(f"{mapName}\t{total:.2f}\t{server_total:.2f}\t{id}")
+    elapsed = time.perf_counter() - start
+    print(f"{len(jobs) - failed} submitted, {failed} failed in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Submit the best unsubmitted games of several maps"
+    )
+    parser.add_argument("maps", nargs="*", default=ALL_MAPS)
+    parser.add_argument("--top", type=int, default=1, help="games per map")
+    parser.add_argument("--workers", type=int, default=Settings.submit_workers)
+    parser.add_argument("--rate", type=float, default=Settings.submit_rate)
+    args = parser.parse_args()
+    submit_all(args.maps, args.top, args.workers, args.rate)
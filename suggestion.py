@@ -17,19 +17,24 @@ def get_total(score: Dict[str, Dict]) -> float:
 
 
 class Suggestion:
+    __slots__ = ("change", "tag")
+
     def __init__(self, change: Dict[str, Dict], tag: str) -> None:
         self.change = change
         self.tag = tag
 
 
 class ScoredSuggestion:
+    # keeps the score components but not the scored locations, thousands of
+    # these are alive at once and only the winner is stored
+    __slots__ = ("change", "tag", "game_score", "game_id", "total")
+
     def __init__(self, suggestion: Suggestion, score: Dict) -> None:
         self.change = suggestion.change
         self.tag = suggestion.tag
-        self.score = score
+        self.game_score: Dict[str, float] = score[SK.gameScore]
+        self.game_id: str = score[SK.gameId]
         self.total = get_total(score)
 
     def get_game_id(self) -> str:
-        if self.score is None:
-            raise SystemError("Missing score")
-        return self.score[SK.gameId]
+        return self.game_id
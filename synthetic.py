@@ -0,0 +1,357 @@
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from data_keys import (
+    CoordinateKeys as CK,
+    GeneralKeys as GK,
+    HotspotKeys as HK,
+    LocationKeys as LK,
+    MapKeys as MK,
+    MapNames as MN,
+)
+from settings import Settings
+
+METERS_PER_DEGREE = 111_320.0
+
+# engines that use the result of another, they stop when it does
+DEPENDENCIES = {
+    "scoring": "build_distance_cache",
+    "incremental_state": "build_distance_cache",
+    "find_possible_locations": "build_hotspot_cache",
+}
+
+
+def make_border(
+    count: int, density: float, latitude: float, longitude: float
+) -> Dict[str, float]:
+    # a square around the centre, density is per square kilometre
+    side = math.sqrt(count / density) * 1000
+    half_lat = side / 2 / METERS_PER_DEGREE
+    half_long = half_lat / math.cos(math.radians(latitude))
+    return {
+        MK.latitudeMin: latitude - half_lat,
+        MK.latitudeMax: latitude + half_lat,
+        MK.longitudeMin: longitude - half_long,
+        MK.longitudeMax: longitude + half_long,
+    }
+
+
+def make_points(
+    rng: random.Random,
+    count: int,
+    border: Dict[str, float],
+    clusters: int,
+    clustering: float,
+    cluster_spread: float,
+) -> List[Tuple[float, float]]:
+    # a clustering share of the points is normal around cluster centres
+    lat_min, lat_max = border[MK.latitudeMin], border[MK.latitudeMax]
+    long_min, long_max = border[MK.longitudeMin], border[MK.longitudeMax]
+    lat_scale = 1 / METERS_PER_DEGREE
+    long_scale = lat_scale / math.cos(math.radians((lat_min + lat_max) / 2))
+    centres = [
+        (rng.uniform(lat_min, lat_max), rng.uniform(long_min, long_max))
+        for _ in range(clusters)
+    ]
+    points = []
+    for _ in range(count):
+        if centres and rng.random() < clustering:
+            lat, long = rng.choice(centres)
+            lat = rng.gauss(lat, cluster_spread * lat_scale)
+            long = rng.gauss(long, cluster_spread * long_scale)
+            lat = min(lat_max, max(lat_min, lat))
+            long = min(long_max, max(long_min, long))
+        else:
+            lat = rng.uniform(lat_min, lat_max)
+            long = rng.uniform(long_min, long_max)
+        points.append((lat, long))
+    return points
+
+
+def generate_regular(
+    generalData: Dict,
+    count: int,
+    seed: int = 0,
+    density: float = 50.0,
+    clusters: int = 10,
+    clustering: float = 0.5,
+    cluster_spread: float = 300.0,
+    type_mix: Optional[Dict[str, float]] = None,
+    mapName: str = MN.goteborg,
+    latitude: float = 57.7,
+    longitude: float = 11.97,
+) -> Dict:
+    rng = random.Random(seed)
+    types = generalData[GK.locationTypes]
+    if type_mix is None:
+        type_mix = {key: 1.0 for key in types}
+    type_keys = list(type_mix)
+    weights = [type_mix[key] for key in type_keys]
+    border = make_border(count, density, latitude, longitude)
+    points = make_points(rng, count, border, clusters, clustering, cluster_spread)
+    locations = {}
+    for i, (lat, long) in enumerate(points):
+        name = f"location{i + 1}"
+        type = types[rng.choices(type_keys, weights)[0]]
+        scale = rng.randint(1, 10)
+        locations[name] = {
+            LK.locationName: name,
+            LK.locationType: type[GK.type_],
+            CK.latitude: lat,
+            CK.longitude: long,
+            LK.footfall: rng.lognormvariate(0, 1) * scale * 10,
+            LK.footfallScale: scale,
+            LK.salesVolume: type[GK.salesVol] * rng.lognormvariate(0, 0.5),
+        }
+    return {"mapName": mapName, MK.border: border, LK.locations: locations}
+
+
+def generate_sandbox(
+    count: int,
+    seed: int = 0,
+    density: float = 50.0,
+    clusters: int = 10,
+    clustering: float = 0.5,
+    cluster_spread: float = 300.0,
+    spread: Tuple[float, float] = (20.0, 200.0),
+    mapName: str = MN.sSandbox,
+    latitude: float = 55.6,
+    longitude: float = 13.0,
+) -> Dict:
+    rng = random.Random(seed)
+    border = make_border(count, density, latitude, longitude)
+    points = make_points(rng, count, border, clusters, clustering, cluster_spread)
+    hotspots = [
+        {
+            "name": f"hotspot{i + 1}",
+            CK.latitude: lat,
+            CK.longitude: long,
+            HK.spread: rng.uniform(*spread),
+            LK.footfall: rng.lognormvariate(0, 0.5),
+        }
+        for i, (lat, long) in enumerate(points)
+    ]
+    return {"mapName": mapName, MK.border: border, HK.hotspots: hotspots}
+
+
+def starting_solution(mapEntity: Dict) -> Dict[str, Dict]:
+    # one f3100 everywhere, like RegularSolver.starting_point
+    return {
+        LK.locations: {
+            key: {LK.f3100Count: 1, LK.f9100Count: 0} for key in mapEntity[LK.locations]
+        }
+    }
+
+
+def sandbox_solution(mapEntity: Dict, generalData: Dict) -> Dict[str, Dict]:
+    # grocery stores on the first hotspots, within the sandbox limits
+    type = generalData[GK.locationTypes][GK.groceryStore][GK.type_]
+    locations = {}
+    for i, hotspot in enumerate(mapEntity[HK.hotspots][:20]):
+        locations[f"location{i + 1}"] = {
+            LK.f3100Count: 1,
+            LK.f9100Count: 0,
+            LK.locationType: type,
+            CK.latitude: hotspot[CK.latitude],
+            CK.longitude: hotspot[CK.longitude],
+        }
+    return {LK.locations: locations}
+
+
+def regular_engines(mapEntity: Dict, generalData: Dict) -> Dict[str, Callable]:
+    from helper import build_distance_cache
+    from incremental_scoring import RegularState
+    from original_scoring import calculateScore as originalCalculateScore
+    from scoring import calculateScore
+
+    mapName = mapEntity["mapName"]
+    solution = starting_solution(mapEntity)
+    distance_cache: Dict = {}
+
+    def distances() -> None:
+        distance_cache.update(
+            build_distance_cache(mapEntity[LK.locations], generalData)
+        )
+
+    return {
+        # runs first, the others use its result
+        "build_distance_cache": distances,
+        "scoring": lambda: calculateScore(
+            mapName, solution, {}, mapEntity, generalData, distance_cache
+        ),
+        "original_scoring": lambda: originalCalculateScore(
+            mapName, solution, mapEntity, generalData
+        ),
+        "incremental_state": lambda: RegularState(
+            mapEntity, generalData, distance_cache, solution
+        ),
+    }
+
+
+def sandbox_engines(mapEntity: Dict, generalData: Dict) -> Dict[str, Callable]:
+    from helper import build_distance_cache
+    from incremental_scoring import SandboxState
+    from map_limiter import MapLimiter
+    from original_scoring import calculateScore as originalCalculateScore
+    from sandbox_helper import build_hotspot_cache, find_possible_locations
+    from scoring import calculateScore
+
+    mapName = mapEntity["mapName"]
+    solution = sandbox_solution(mapEntity, generalData)
+    names = {key: key for key in solution[LK.locations]}
+    distance_cache = build_distance_cache(solution[LK.locations], generalData)
+    map_limiter = MapLimiter(**mapEntity[MK.border])
+    hotspot_cache: Dict = {}
+
+    def hotspots() -> None:
+        hotspot_cache.update(build_hotspot_cache(mapEntity, generalData))
+
+    return {
+        "build_hotspot_cache": hotspots,
+        "find_possible_locations": lambda: find_possible_locations(
+            hotspot_cache, map_limiter
+        ),
+        "scoring": lambda: calculateScore(
+            mapName,
+            solution,
+            {},
+            mapEntity,
+            generalData,
+            distance_cache,
+            sandbox_names=names,
+            inverse_sandbox_names=names,
+            hotspot_footfall_cache={},
+        ),
+        "original_scoring": lambda: originalCalculateScore(
+            mapName, solution, mapEntity, generalData
+        ),
+        "incremental_state": lambda: SandboxState(mapEntity, generalData, solution),
+    }
+
+
+def scaling(
+    generalData: Dict, sandbox: bool, sizes: List[int], seed: int, limit: float
+) -> Dict[str, List[Tuple[int, float]]]:
+    # engines that took longer than limit are not run on larger sizes, nor
+    # are the engines that depend on them
+    results: Dict[str, List[Tuple[int, float]]] = {}
+    stopped = set()
+    for size in sizes:
+        if sandbox:
+            mapEntity = generate_sandbox(size, seed)
+            engines = sandbox_engines(mapEntity, generalData)
+        else:
+            mapEntity = generate_regular(generalData, size, seed)
+            engines = regular_engines(mapEntity, generalData)
+        for name, function in engines.items():
+            if name in stopped:
+                continue
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            results.setdefault(name, []).append((size, elapsed))
+            print(f"{name}\t{size}\t{elapsed * 1000:.1f} ms", file=sys.stderr)
+            if elapsed > limit:
+                stopped.add(name)
+                stopped.update(
+                    engine
+                    for engine, dependency in DEPENDENCIES.items()
+                    if dependency == name
+                )
+    return results
+
+
+def exponent(points: List[Tuple[int, float]]) -> Optional[float]:
+    # least squares slope in log-log, 1 is linear and 2 quadratic
+    points = [(n, t) for n, t in points if t > 0]
+    if len(points) < 2:
+        return None
+    xs = [math.log(n) for n, _ in points]
+    ys = [math.log(t) for _, t in points]
+    mx = sum(xs) / len(xs)
+    my = sum(ys) / len(ys)
+    sxx = sum((x - mx) ** 2 for x in xs)
+    if sxx == 0:
+        return None
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx
+
+
+def load_general() -> Dict:
+    with open(f"{Settings.cache_folder}/general.json", "r", encoding="utf8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic maps for scale testing")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="write a synthetic map")
+    generate.add_argument("count", type=int, help="locations or hotspots")
+    generate.add_argument("--sandbox", action="store_true")
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--density", type=float, default=50.0, help="per km2")
+    generate.add_argument("--clusters", type=int, default=10)
+    generate.add_argument("--clustering", type=float, default=0.5)
+    generate.add_argument("--cluster-spread", type=float, default=300.0)
+    generate.add_argument(
+        "--type-mix", help='json weights, e.g. {"kiosk": 3, "gasStation": 1}'
+    )
+    generate.add_argument("--spread", type=float, nargs=2, default=[20.0, 200.0])
+    generate.add_argument("--output", default="synthetic")
+
+    scale = commands.add_parser("scale", help="time the engines against size")
+    scale.add_argument("--sandbox", action="store_true")
+    scale.add_argument(
+        "--sizes", type=int, nargs="+", default=[400, 1000, 4000, 10000, 40000]
+    )
+    scale.add_argument("--seed", type=int, default=0)
+    scale.add_argument("--limit", type=float, default=30.0, help="seconds")
+
+    args = parser.parse_args()
+    generalData = load_general()
+    if args.command == "generate":
+        if args.sandbox:
+            mapEntity = generate_sandbox(
+                args.count,
+                args.seed,
+                args.density,
+                args.clusters,
+                args.clustering,
+                args.cluster_spread,
+                tuple(args.spread),
+            )
+        else:
+            type_mix = json.loads(args.type_mix) if args.type_mix else None
+            mapEntity = generate_regular(
+                generalData,
+                args.count,
+                args.seed,
+                args.density,
+                args.clusters,
+                args.clustering,
+                args.cluster_spread,
+                type_mix,
+            )
+        os.makedirs(args.output, exist_ok=True)
+        path = f"{args.output}/{mapEntity['mapName']}.json"
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(mapEntity, f)
+        print(path)
+    else:
+        # the engines print progress, keep stdout for the report
+        with contextlib.redirect_stdout(sys.stderr):
+            results = scaling(
+                generalData, args.sandbox, args.sizes, args.seed, args.limit
+            )
+        report = {
+            name: {"points": points, "exponent": exponent(points)}
+            for name, points in results.items()
+        }
+        print(json.dumps(report, indent=4))
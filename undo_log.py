@@ -0,0 +1,32 @@
+from typing import Any, Dict, List, Tuple
+
+
+MISSING = object()
+
+
+class UndoLog:
+    def __init__(self) -> None:
+        self.entries: List[Tuple[Dict, Any, Any]] = []
+
+    def set(self, container: Dict, key: Any, value: Any) -> None:
+        self.entries.append((container, key, container.get(key, MISSING)))
+        container[key] = value
+
+    def delete(self, container: Dict, key: Any) -> None:
+        self.entries.append((container, key, container[key]))
+        del container[key]
+
+    def rollback(self) -> None:
+        # restore in reverse so repeated changes to a key end at the oldest value
+        for container, key, old in reversed(self.entries):
+            if old is MISSING:
+                del container[key]
+            else:
+                container[key] = old
+        self.entries.clear()
+
+    def commit(self) -> None:
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)